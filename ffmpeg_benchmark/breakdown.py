@@ -0,0 +1,344 @@
+import re
+import time
+import logging
+import threading
+import subprocess
+from collections import deque
+
+import ffmpeg
+import handystats
+
+from ffmpeg_benchmark import transcode
+from ffmpeg_benchmark import utils
+from ffmpeg_benchmark import sysinfo
+
+logger = logging.getLogger('ffmpeg_benchmark')
+cmd_logger = logging.getLogger('ffmpeg_benchmark_cmd')
+
+RE_BENCH_ALL = re.compile(r'^bench: *(\d+) user *(\d+) sys *(\d+) real (\w+)')
+BASELINES = (
+    'copy',
+    'decode',
+    'none',
+)
+STAGES = (
+    'decode',
+    'filter',
+    'encode',
+)
+STATS_PERIOD = 1
+# Last stderr lines kept to report errors
+TAIL_SIZE = 20
+
+
+def make_parser(subparsers):
+    parser = subparsers.add_parser("breakdown", help="Split transcoding time between decode, filtergraph and encode")
+
+    parser.add_argument("--threads", type=int, help="Number of threads to use.")
+    parser.add_argument("--filter-threads", type=int, help="Number of threads are used to process a filter pipeline.")
+
+    parser.add_argument("--input", "-i", required=True)
+    parser.add_argument("--input-disable-audio", action='store_true')
+
+    parser.add_argument("--preset", help="Preset name", required=False, choices=transcode.PRESETS)
+    parser.add_argument("--crf", type=int, required=False, help="From 0 (loseless), max depends of codec")
+    parser.add_argument("--tune", required=False, choices=transcode.TUNES)
+
+    parser.add_argument("--output", "-o", default="/dev/null")
+    parser.add_argument('--output-format', "-f", required=False)
+    parser.add_argument('--output-scale', required=False)
+    parser.add_argument("--output-video-codec", '-oc:v', required=False)
+    parser.add_argument("--output-disable-audio", action="store_true")
+
+    parser.add_argument("--hwaccel", default="none")
+
+    parser.add_argument("--baseline", default="copy", choices=BASELINES, help="Run whose demuxing and muxing time is subtracted from the filtergraph")
+    parser.add_argument("--stats-period", type=float, default=STATS_PERIOD, help="Seconds between progress reports")
+
+
+def get_stage(name):
+    """Map a ``-benchmark_all`` event, like ``decode_video``, to a stage."""
+    kind = name.split('_')[0]
+    if kind == 'decode':
+        return 'decode'
+    if kind in ('encode', 'flush'):
+        return 'encode'
+    return None
+
+
+def read_progress(fd, frames):
+    """Collect ``(time, frame)`` from ``-progress`` reports."""
+    for line in fd:
+        key, _, value = line.decode().strip().partition('=')
+        if key == 'frame' and value.isdigit():
+            frames.append((time.perf_counter(), int(value)))
+
+
+class StageTimes:
+    """
+    Accumulate ``-benchmark_all`` lines of a ffmpeg run as they are read.
+
+    Each line holds the user, sys and real microseconds of one decode or
+    encode call. Only sums are kept, the output of long runs is not stored.
+    """
+    def __init__(self):
+        self.times = {
+            stage: {'user': 0.0, 'sys': 0.0, 'real': 0.0, 'calls': 0}
+            for stage in STAGES
+        }
+        self.bench = {}
+        self.ffmpeg_version = None
+        self.tail = deque(maxlen=TAIL_SIZE)
+
+    def feed(self, line):
+        if self.ffmpeg_version is None:
+            self.ffmpeg_version = utils.parse_version(line) or ''
+        search = RE_BENCH_ALL.search(line)
+        if search:
+            stage = get_stage(search.group(4))
+            if stage is None:
+                logger.debug("Unknown benchmark event: %s", line.rstrip())
+                return
+            times = self.times[stage]
+            times['user'] += int(search.group(1))
+            times['sys'] += int(search.group(2))
+            times['real'] += int(search.group(3))
+            times['calls'] += 1
+        elif line.startswith('bench:'):
+            self.bench.update(transcode.RE_BENCH.findall(line.split(': ')[1]))
+        else:
+            self.tail.append(line.rstrip())
+
+    def get_totals(self):
+        """Process user, sys and real microseconds from ``-benchmark``."""
+        return {
+            key: float(self.bench[name]) * 1e6
+            for key, name in (('user', 'utime'), ('sys', 'stime'), ('real', 'rtime'))
+            if name in self.bench
+        }
+
+    def get_residual(self):
+        """Time spent out of decode and encode calls: demuxing, filtering, muxing."""
+        totals = self.get_totals()
+        return {
+            key: max(0, total - self.times['decode'][key] - self.times['encode'][key])
+            for key, total in totals.items()
+        }
+
+
+class Breakdown:
+    """
+    Attribute transcoding time to decode, filtergraph and encode.
+
+    ffmpeg's ``-benchmark_all`` times each decode and encode call, the
+    filtergraph gets the rest of the run, minus the demuxing and muxing time
+    of a baseline run. Timestamps come from ``getrusage``, so with threaded
+    codecs the user and sys time of a call include other threads' work,
+    real time is the reliable split.
+    """
+    def __init__(
+        self,
+        input,
+
+        threads=None,
+        filter_threads=None,
+
+        input_disable_audio=False,
+
+        preset=None,
+        crf=None,
+        tune=None,
+
+        output=None,
+        output_format=None,
+        output_scale=None,
+        output_video_codec=None,
+        output_disable_audio=None,
+
+        hwaccel='none',
+        baseline='copy',
+        stats_period=STATS_PERIOD,
+
+        verbosity=1,
+    ):
+        self.transcoder = transcode.Transcoder(
+            input=input,
+            threads=threads,
+            filter_threads=filter_threads,
+            input_disable_audio=input_disable_audio,
+            preset=preset,
+            crf=crf,
+            tune=tune,
+            output=output,
+            output_format=output_format,
+            output_scale=output_scale,
+            output_video_codec=output_video_codec,
+            output_disable_audio=output_disable_audio,
+            hwaccel=hwaccel,
+            cgroup_enabled=False,
+            verbosity=verbosity,
+        )
+        self.input = input
+        self.threads = threads
+        self.input_disable_audio = input_disable_audio
+        self.output_disable_audio = output_disable_audio
+        self.hwaccel = hwaccel
+        self.baseline = baseline
+        self.stats_period = stats_period
+        self.verbosity = verbosity
+
+    def make_baseline_stream(self):
+        """Demux and decode only for ``decode``, demux only for ``copy``."""
+        input_kwargs = {}
+        if self.baseline == 'decode':
+            input_kwargs['hwaccel'] = self.hwaccel
+            if self.threads is not None:
+                input_kwargs['threads'] = self.threads
+        if self.input_disable_audio:
+            input_kwargs['an'] = None
+        stream = ffmpeg.input(self.input, **input_kwargs)
+        output_kwargs = {
+            'format': 'null',
+            'benchmark': None,
+        }
+        if self.baseline == 'copy':
+            output_kwargs['c'] = 'copy'
+        if self.output_disable_audio:
+            output_kwargs['an'] = None
+        return stream.output('-', **output_kwargs)
+
+    def measure(self, output_stream):
+        stream = output_stream.global_args(
+            '-benchmark_all',
+            '-stats_period', str(self.stats_period),
+            '-progress', 'pipe:1',
+            '-nostats',
+        )
+        cmd = ffmpeg.compile(stream, overwrite_output=True)
+        cmd_logger.debug(' '.join(cmd))
+        stage_times = StageTimes()
+        frames = []
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        assert proc.stdout is not None and proc.stderr is not None
+        reader = threading.Thread(target=read_progress, args=(proc.stdout, frames))
+        reader.start()
+        for line in proc.stderr:
+            stage_times.feed(line.decode(errors='replace'))
+        proc.wait()
+        elapsed = time.perf_counter() - t0
+        reader.join()
+        if proc.returncode:
+            raise ValueError(
+                f"ffmpeg exited with code {proc.returncode}: " + '\n'.join(stage_times.tail)
+            )
+        return stage_times, frames, elapsed
+
+    def run(self):
+        logger.info("Started breakdown run")
+        stage_times, frames, elapsed = self.measure(self.transcoder.make_output_stream())
+        nb_frames = frames[-1][1] if frames else self.transcoder.input_probe_data['input_video_nb_frames']
+        totals = stage_times.get_totals()
+        residual = stage_times.get_residual()
+
+        baseline_residual = {}
+        baseline_elapsed = None
+        if self.baseline != 'none':
+            logger.info("Started %s baseline run", self.baseline)
+            baseline_times, _, baseline_elapsed = self.measure(self.make_baseline_stream())
+            baseline_residual = baseline_times.get_residual()
+        # Filtergraph is what remains once demuxing and muxing are removed
+        filter_times = stage_times.times['filter']
+        for key, value in residual.items():
+            filter_times[key] = max(0, value - baseline_residual.get(key, 0))
+
+        results = {
+            'ffmpeg_version': stage_times.ffmpeg_version,
+            'threads': self.threads,
+            'filter_threads': self.transcoder.filter_threads,
+            'hwaccel': self.hwaccel,
+
+            'preset': self.transcoder.preset,
+            'crf': self.transcoder.crf,
+            'tune': self.transcoder.tune,
+
+            'input': self.input,
+            **self.transcoder.input_probe_data,
+
+            'output': self.transcoder.output,
+            'output_scale': self.transcoder.output_scale,
+            'output_video_codec': self.transcoder.output_video_codec,
+
+            'nb_frames': nb_frames,
+            'elapsed': elapsed,
+            'fps': nb_frames / elapsed,
+            'baseline': self.baseline,
+        }
+        cpu_total = totals.get('user', 0) + totals.get('sys', 0)
+        for stage in STAGES:
+            times = stage_times.times[stage]
+            cpu = times['user'] + times['sys']
+            results.update({
+                f'{stage}_user': times['user'] / 1e6,
+                f'{stage}_sys': times['sys'] / 1e6,
+                f'{stage}_real': times['real'] / 1e6,
+                f'{stage}_real_us_per_frame': times['real'] / nb_frames,
+                f'{stage}_cpu_us_per_frame': cpu / nb_frames,
+            })
+            if stage != 'filter':
+                results[f'{stage}_calls'] = times['calls']
+            if totals.get('real'):
+                results[f'{stage}_real_percent'] = times['real'] / totals['real'] * 100
+            if cpu_total:
+                results[f'{stage}_cpu_percent'] = cpu / cpu_total * 100
+        if baseline_residual:
+            results.update({
+                'baseline_elapsed': baseline_elapsed,
+                'baseline_real': baseline_residual['real'] / 1e6,
+                'baseline_real_us_per_frame': baseline_residual['real'] / nb_frames,
+            })
+        # Throughput over each stats period
+        period_fpss = [
+            (frame - prev_frame) / (t - prev_t)
+            for (prev_t, prev_frame), (t, frame) in zip(frames, frames[1:])
+            if t > prev_t
+        ]
+        if period_fpss:
+            results.update(handystats.full_stats(period_fpss, prefix='period_fps_'))
+        return results
+
+
+def breakdown(**kwargs):
+    breakdowner = Breakdown(**kwargs)
+    results = breakdowner.run()
+    return results
+
+
+def main(args):
+    host_info = sysinfo.get_sysinfo()
+    sysinfo.validate_transcode(host_info, vars(args))
+    results = breakdown(
+        input=args.input,
+        threads=args.threads,
+        filter_threads=args.filter_threads,
+
+        input_disable_audio=args.input_disable_audio,
+
+        preset=args.preset,
+        crf=args.crf,
+        tune=args.tune,
+
+        output=args.output,
+        output_format=args.output_format,
+        output_scale=args.output_scale,
+        output_video_codec=args.output_video_codec,
+        output_disable_audio=args.output_disable_audio,
+
+        hwaccel=args.hwaccel,
+        baseline=args.baseline,
+        stats_period=args.stats_period,
+
+        verbosity=args.verbosity,
+    )
+    results.update(sysinfo.summarize(host_info))
+    return results
@@ -0,0 +1,187 @@
+import os
+import atexit
+import logging
+from pathlib import Path
+
+logger = logging.getLogger('ffmpeg_benchmark')
+
+CGROUP_ROOT = Path('/sys/fs/cgroup')
+CPU_PERIOD = 100000
+MAIN_CGROUP = 'ffmpeg-benchmark-main'
+
+_jobs_parent = None
+# Parent cgroup, main cgroup and controllers to undo at exit
+_restore_state = None
+
+
+def get_current_cgroup():
+    """Return the cgroup v2 directory of the current process, or None."""
+    try:
+        with open('/proc/self/cgroup') as fd:
+            lines = fd.read().splitlines()
+    except OSError:
+        return None
+    for line in lines:
+        hierarchy, _, path = line.split(':', 2)
+        if hierarchy == '0':
+            return CGROUP_ROOT / path.lstrip('/')
+    return None
+
+
+def get_jobs_parent():
+    """Return the cgroup under which job cgroups are created."""
+    return _jobs_parent or get_current_cgroup()
+
+
+def is_available():
+    """Whether child cgroups can be created under the current one."""
+    parent = get_jobs_parent()
+    if parent is None or not (parent / 'cgroup.procs').exists():
+        return False
+    return os.access(parent, os.W_OK)
+
+
+def enable_controllers(controllers=('cpu', 'memory')):
+    """
+    Make ``controllers`` usable by job cgroups.
+
+    cgroup v2 forbids processes in a cgroup delegating controllers to its
+    children, so this process first moves in a leaf sibling of the job
+    cgroups. The current cgroup must be delegated to the user, e.g. with
+    ``systemd-run --user --scope -p Delegate=yes``. Changes are undone at
+    exit by ``restore_controllers()``.
+    """
+    global _jobs_parent, _restore_state
+    parent = get_jobs_parent()
+    if parent is None:
+        raise ValueError("cgroup v2 is not available")
+    available = (parent / 'cgroup.controllers').read_text().split()
+    missing = [c for c in controllers if c not in available]
+    if missing:
+        raise ValueError(f"cgroup controllers not delegated to {parent}: {', '.join(missing)}")
+    enabled = (parent / 'cgroup.subtree_control').read_text().split()
+    if all(c in enabled for c in controllers):
+        _jobs_parent = parent
+        return parent
+    main_cgroup = parent / MAIN_CGROUP
+    main_cgroup.mkdir(exist_ok=True)
+    if _restore_state is None:
+        _restore_state = (parent, main_cgroup, [])
+        atexit.register(restore_controllers)
+    _restore_state[2].extend(c for c in controllers if c not in enabled)
+    try:
+        (main_cgroup / 'cgroup.procs').write_text(str(os.getpid()))
+        (parent / 'cgroup.subtree_control').write_text(
+            ' '.join(f'+{c}' for c in controllers)
+        )
+    except OSError as err:
+        restore_controllers()
+        raise ValueError(f"Cannot enable cgroup controllers in {parent}: {err}")
+    _jobs_parent = parent
+    logger.debug("Enabled cgroup controllers %s in %s", controllers, parent)
+    return parent
+
+
+def restore_controllers():
+    """
+    Undo ``enable_controllers()``: disable the controllers it enabled, move
+    this process back to its cgroup and remove the main cgroup.
+    """
+    global _jobs_parent, _restore_state
+    if _restore_state is None:
+        return
+    parent, main_cgroup, controllers = _restore_state
+    _restore_state = None
+    _jobs_parent = None
+    try:
+        if controllers:
+            (parent / 'cgroup.subtree_control').write_text(
+                ' '.join(f'-{c}' for c in controllers)
+            )
+        (parent / 'cgroup.procs').write_text(str(os.getpid()))
+        main_cgroup.rmdir()
+    except OSError as err:
+        logger.warning("Cannot restore cgroup %s: %s", parent, err)
+        return
+    logger.debug("Restored cgroup controllers of %s", parent)
+
+
+def parse_memory(value):
+    """Convert sizes like ``512M`` or ``2G`` to bytes."""
+    value = str(value).strip()
+    units = {'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+    unit = value[-1:].upper()
+    if unit in units:
+        return int(float(value[:-1]) * units[unit])
+    return int(value)
+
+
+def parse_stat(content):
+    stats = {}
+    for line in content.splitlines():
+        key, _, value = line.partition(' ')
+        if value.isdigit():
+            stats[key] = int(value)
+    return stats
+
+
+class Cgroup:
+    """A child cgroup of the current process' one, for a single job."""
+    def __init__(self, name, parent=None):
+        self.parent = Path(parent) if parent else get_jobs_parent()
+        self.path = self.parent / name
+
+    def create(self):
+        try:
+            self.path.mkdir()
+        except FileExistsError:
+            # Left by a crashed run, its stats would be mixed with this job's
+            logger.warning("Replacing stale cgroup %s", self.path)
+            self.path.rmdir()
+            self.path.mkdir()
+        return self
+
+    def add(self, pid):
+        self.write('cgroup.procs', pid)
+
+    def read(self, filename):
+        return (self.path / filename).read_text()
+
+    def write(self, filename, value):
+        (self.path / filename).write_text(str(value))
+
+    def cpu_stat(self):
+        return parse_stat(self.read('cpu.stat'))
+
+    def set_limits(self, cpus=None, memory=None):
+        """Apply a CPU quota, in number of CPUs, and a memory limit."""
+        if cpus is not None:
+            self.write('cpu.max', f"{int(cpus * CPU_PERIOD)} {CPU_PERIOD}")
+        if memory is not None:
+            self.write('memory.max', parse_memory(memory))
+            if (self.path / 'memory.swap.max').exists():
+                self.write('memory.swap.max', 0)
+
+    def get_limit_stats(self):
+        """Throttling and memory pressure of the cgroup."""
+        cpu_stat = self.cpu_stat()
+        stats = {
+            'nr_periods': cpu_stat.get('nr_periods'),
+            'nr_throttled': cpu_stat.get('nr_throttled'),
+            'throttled_time': cpu_stat.get('throttled_usec', 0) / 1e6,
+        }
+        if (self.path / 'memory.peak').exists():
+            stats['memory_peak'] = int(self.read('memory.peak'))
+        if (self.path / 'memory.events').exists():
+            stats['oom_kill'] = parse_stat(self.read('memory.events')).get('oom_kill')
+        return stats
+
+    def cpu_time(self):
+        """CPU seconds used by all processes of the cgroup."""
+        return self.cpu_stat()['usage_usec'] / 1e6
+
+    def remove(self):
+        try:
+            self.path.rmdir()
+        except OSError as err:
+            logger.warning("Cannot remove cgroup %s: %s", self.path, err)
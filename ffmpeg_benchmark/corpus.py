@@ -0,0 +1,250 @@
+import os
+import copy
+import glob
+import json
+import logging
+from pathlib import Path
+from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+
+from ffmpeg_benchmark import probe
+
+logger = logging.getLogger('ffmpeg_benchmark')
+
+VIDEO_EXTENSIONS = (
+    '.mp4',
+    '.m4v',
+    '.mkv',
+    '.mov',
+    '.webm',
+    '.avi',
+    '.ts',
+    '.mts',
+    '.m2ts',
+    '.mxf',
+    '.y4m',
+    '.flv',
+)
+MANIFEST_EXTENSIONS = (
+    '.txt',
+    '.json',
+    '.jsonl',
+)
+WEIGHTS = (
+    'frames',
+    'duration',
+)
+PROBE_WORKERS = 8
+# Keys also aggregated per content category
+SUMMARY_KEYS = (
+    'fps_mean',
+    'vmaf_mean',
+    'psnr_avg_mean',
+    'output_size',
+    'frames_per_joule',
+)
+
+
+def add_arguments(parser):
+    parser.add_argument("--corpus-weight", default="frames", choices=WEIGHTS, help="How titles are weighted in corpus aggregates")
+    parser.add_argument("--corpus-parallel", type=int, default=1, help="Number of titles benchmarked at once, measurements interfere above 1")
+    parser.add_argument("--probe-workers", type=int, default=PROBE_WORKERS, help="Number of inputs probed at once")
+
+
+def is_corpus(spec):
+    spec = str(spec)
+    # Files and URLs may contain glob characters, like "Movie [1080p].mp4"
+    if '://' in spec:
+        return False
+    if os.path.isfile(spec):
+        return spec.endswith(MANIFEST_EXTENSIONS)
+    return glob.has_magic(spec) or os.path.isdir(spec)
+
+
+def read_manifest(filename):
+    """
+    Read a manifest of inputs, either one path per line or JSON objects with
+    ``input`` and optional ``name`` and ``category``.
+    """
+    base = Path(filename).parent
+    with open(filename) as fd:
+        content = fd.read()
+    if filename.endswith('.json'):
+        items = json.loads(content)
+    else:
+        items = [
+            json.loads(line) if line.lstrip().startswith('{') else {'input': line.strip()}
+            for line in content.splitlines()
+            if line.strip() and not line.startswith('#')
+        ]
+    entries = []
+    for item in items:
+        if isinstance(item, str):
+            item = {'input': item}
+        path = item['input']
+        if '://' not in path and not os.path.isabs(path):
+            path = str(base / path)
+        entries.append({**item, 'input': path})
+    return entries
+
+
+def list_inputs(spec):
+    """Resolve a directory, glob or manifest to a list of entries."""
+    spec = str(spec)
+    entries: list[dict[str, Any]]
+    if os.path.isdir(spec):
+        paths = sorted(
+            str(path) for path in Path(spec).rglob('*')
+            if path.suffix.lower() in VIDEO_EXTENSIONS
+        )
+        entries = [{'input': path} for path in paths]
+    elif os.path.isfile(spec):
+        entries = read_manifest(spec)
+    else:
+        entries = [{'input': path} for path in sorted(glob.glob(spec, recursive=True))]
+    if not entries:
+        raise ValueError(f"No input found in corpus {spec}")
+    names = set()
+    for entry in entries:
+        name = entry.get('name') or Path(entry['input']).stem
+        # Keep names unique, they prefix per-title results
+        base_name, i = name, 1
+        while name in names:
+            i += 1
+            name = f"{base_name}-{i}"
+        names.add(name)
+        entry['name'] = name
+        entry.setdefault('category', None)
+    return entries
+
+
+def title_filename(filename, name):
+    """Derive a per-title filename, like ``vmaf-bbb.json`` from ``vmaf.json``."""
+    path = Path(filename)
+    return str(path.with_name(f"{path.stem}-{name}{path.suffix}"))
+
+
+def pair_inputs(original_spec, new_spec):
+    """Match original and new inputs by title name."""
+    originals = {entry['name']: entry for entry in list_inputs(original_spec)}
+    pairs = []
+    for entry in list_inputs(new_spec):
+        original = originals.get(entry['name'])
+        if original is None:
+            logger.warning("No original input for %s", entry['input'])
+            continue
+        pairs.append({
+            **original,
+            'new_input': entry['input'],
+        })
+    return pairs
+
+
+def probe_all(entries, workers=PROBE_WORKERS):
+    """Probe all entries in parallel, unreadable ones are dropped."""
+    def _probe(entry):
+        try:
+            return probe.extract_data(probe.probe(entry['input']))
+        except Exception as err:
+            logger.warning("Cannot probe %s: %s", entry['input'], err)
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        probes = list(executor.map(_probe, entries))
+    probed = []
+    for entry, data in zip(entries, probes):
+        if data is not None:
+            probed.append({**entry, 'probe': data})
+    logger.info("Probed %s/%s inputs", len(probed), len(entries))
+    return probed
+
+
+def get_weight(entry, weight):
+    if weight == 'duration':
+        return entry['probe']['duration']
+    return entry['probe'].get('video_nb_frames') or entry['probe']['duration']
+
+
+def is_metric(key, value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    return not key.startswith(('host_', 'input_', 'output_video_', 'output_audio_'))
+
+
+def weighted_means(titles, weight, prefix):
+    results = {}
+    keys = set.intersection(*(set(title['results']) for title in titles))
+    for key in sorted(keys):
+        values = [title['results'][key] for title in titles]
+        if not all(is_metric(key, value) for value in values):
+            continue
+        weights = [get_weight(title, weight) for title in titles]
+        results[f'{prefix}{key}'] = sum(v * w for v, w in zip(values, weights)) / sum(weights)
+    return results
+
+
+def aggregate(titles, weight='frames'):
+    """Corpus-level and per-category aggregates of per-title results."""
+    results = {
+        'corpus_titles': len(titles),
+        'corpus_weight': weight,
+        'corpus_duration': sum(title['probe']['duration'] for title in titles),
+    }
+    if not titles:
+        return results
+    elapseds = [title['results'].get('elapsed_mean') for title in titles]
+    frames = [title['probe'].get('video_nb_frames') for title in titles]
+    if None not in elapseds and None not in frames:
+        results['corpus_frames'] = sum(frames)
+        results['corpus_fps'] = sum(frames) / sum(elapseds)
+    results.update(weighted_means(titles, weight, prefix='corpus_'))
+
+    categories = sorted({t['category'] for t in titles if t['category']})
+    for category in categories:
+        category_titles = [t for t in titles if t['category'] == category]
+        means = weighted_means(category_titles, weight, prefix='')
+        results[f'category_{category}_titles'] = len(category_titles)
+        results.update({
+            f'category_{category}_{key}': value
+            for key, value in means.items()
+            if key in SUMMARY_KEYS
+        })
+    return results
+
+
+def run(entries, benchmark, make_args, args):
+    """
+    Probe entries, run ``benchmark`` on each with arguments built by
+    ``make_args(args, entry)`` and return per-title and corpus results.
+    """
+    nb_entries = len(entries)
+    entries = probe_all(entries, workers=args.probe_workers)
+    if not entries:
+        raise ValueError("No readable input in corpus")
+
+    def _run(entry):
+        logger.info("Started title %s", entry['name'])
+        try:
+            return benchmark(make_args(copy.copy(args), entry))
+        except Exception:
+            logger.exception("Title %s failed", entry['name'])
+            return None
+
+    with ThreadPoolExecutor(max_workers=args.corpus_parallel) as executor:
+        title_results = list(executor.map(_run, entries))
+
+    titles = []
+    results = {}
+    for entry, title_result in zip(entries, title_results):
+        if title_result is None:
+            results[f"title_{entry['name']}_ok"] = False
+            continue
+        titles.append({**entry, 'results': title_result})
+        results.update({
+            f"title_{entry['name']}_{key}": value
+            for key, value in title_result.items()
+            if is_metric(key, value)
+        })
+    results.update(aggregate(titles, weight=args.corpus_weight))
+    results['corpus_error_count'] = nb_entries - len(titles)
+    return results
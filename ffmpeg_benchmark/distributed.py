@@ -0,0 +1,416 @@
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from ffmpeg_benchmark import transcode
+from ffmpeg_benchmark import sysinfo
+
+logger = logging.getLogger('ffmpeg_benchmark')
+
+HOST = '0.0.0.0'
+PORT = 8642
+LEASE_TIMEOUT = 60
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 2
+CONNECT_RETRIES = 5
+
+
+def make_parser(subparsers):
+    parser = subparsers.add_parser("coordinator", help="Serve transcode jobs to distributed workers")
+
+    parser.add_argument("--jobs", "-j", required=True, help="JSON or JSON lines file of transcode keyword arguments")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of times each job is run")
+    parser.add_argument("--results-file", default="results.jsonl")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--lease-timeout", type=int, default=LEASE_TIMEOUT, help="Seconds without heartbeat before a job is given to another worker")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS)
+    parser.add_argument("--host-limit", action="append", default=[], help="Max concurrent jobs for a host, as HOSTNAME=N")
+    parser.add_argument("--default-host-limit", type=int, default=1, help="Max concurrent jobs for hosts without --host-limit")
+    parser.add_argument("--local-workers", type=int, default=0, help="Number of workers started in this process")
+    parser.add_argument("--validate", action="store_true", help="Check jobs against this host's ffmpeg before serving them")
+
+    parser = subparsers.add_parser("worker", help="Run transcode jobs from a coordinator")
+
+    parser.add_argument("--coordinator", "-c", required=True, help="Coordinator URL, like http://host:8642")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of jobs leased at once")
+    parser.add_argument("--hostname", default=socket.gethostname(), help="Name used for host concurrency limits")
+
+
+def load_jobs(filename):
+    with open(filename) as fd:
+        content = fd.read()
+    try:
+        jobs = json.loads(content)
+    except json.JSONDecodeError:
+        jobs = [json.loads(line) for line in content.splitlines() if line.strip()]
+    if isinstance(jobs, dict):
+        jobs = [jobs]
+    return jobs
+
+
+class Coordinator:
+    """
+    Hold a queue of transcode jobs and lease them to workers.
+
+    A lease must be renewed by heartbeats, jobs of expired leases are put back
+    in the queue until they reach ``max_attempts``.
+    """
+    def __init__(
+        self,
+        jobs,
+        results_file=None,
+        lease_timeout=LEASE_TIMEOUT,
+        max_attempts=MAX_ATTEMPTS,
+        host_limits=None,
+        default_host_limit=1,
+    ):
+        self.jobs = {
+            str(i): {'id': str(i), 'spec': spec, 'attempts': 0, 'status': 'pending'}
+            for i, spec in enumerate(jobs)
+        }
+        self.queue = deque(self.jobs)
+        self.leases = {}
+        self.results = []
+        self.results_file = results_file
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.host_limits = host_limits or {}
+        self.default_host_limit = default_host_limit
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        if not self.jobs:
+            self.done.set()
+
+    def _host_leases(self, host):
+        return sum(1 for lease in self.leases.values() if lease['host'] == host)
+
+    def _finish(self, job, status):
+        job['status'] = status
+        if all(j['status'] in ('done', 'failed') for j in self.jobs.values()):
+            self.done.set()
+
+    def _expire(self):
+        now = time.monotonic()
+        for lease_id, lease in list(self.leases.items()):
+            if lease['expires'] > now:
+                continue
+            del self.leases[lease_id]
+            job = self.jobs[lease['job_id']]
+            logger.warning("Lease of job #%s expired on %s", job['id'], lease['worker_id'])
+            if job['attempts'] >= self.max_attempts:
+                self._finish(job, 'failed')
+            else:
+                job['status'] = 'pending'
+                self.queue.appendleft(job['id'])
+
+    def expire(self):
+        with self.lock:
+            self._expire()
+
+    def lease(self, worker_id, host):
+        with self.lock:
+            self._expire()
+            if self.done.is_set():
+                return None, True
+            limit = self.host_limits.get(host, self.default_host_limit)
+            if not self.queue or self._host_leases(host) >= limit:
+                return None, False
+            job = self.jobs[self.queue.popleft()]
+            job['attempts'] += 1
+            job['status'] = 'running'
+            lease_id = uuid.uuid4().hex
+            self.leases[lease_id] = {
+                'job_id': job['id'],
+                'worker_id': worker_id,
+                'host': host,
+                'expires': time.monotonic() + self.lease_timeout,
+            }
+            logger.info("Leased job #%s to %s (attempt %s)", job['id'], worker_id, job['attempts'])
+            return {
+                'lease_id': lease_id,
+                'job_id': job['id'],
+                'attempt': job['attempts'],
+                'spec': job['spec'],
+                'lease_timeout': self.lease_timeout,
+            }, False
+
+    def heartbeat(self, lease_id):
+        with self.lock:
+            lease = self.leases.get(lease_id)
+            if lease is None:
+                return False
+            lease['expires'] = time.monotonic() + self.lease_timeout
+            return True
+
+    def complete(self, lease_id, ok, result, fingerprint, error=None):
+        with self.lock:
+            lease = self.leases.pop(lease_id, None)
+            if lease is None:
+                # The job was already given to another worker
+                return False
+            job = self.jobs[lease['job_id']]
+            record = {
+                'job_id': job['id'],
+                'attempt': job['attempts'],
+                'worker_id': lease['worker_id'],
+                'ok': ok,
+                'error': error,
+                'host': fingerprint,
+                'spec': job['spec'],
+                'result': result,
+            }
+            self.results.append(record)
+            if self.results_file:
+                with open(self.results_file, 'a') as fd:
+                    fd.write(json.dumps(record, default=str) + '\n')
+            if ok:
+                self._finish(job, 'done')
+            elif job['attempts'] >= self.max_attempts:
+                self._finish(job, 'failed')
+            else:
+                job['status'] = 'pending'
+                self.queue.append(job['id'])
+            return True
+
+    def status(self):
+        with self.lock:
+            statuses = [job['status'] for job in self.jobs.values()]
+            return {
+                'jobs': len(statuses),
+                'pending': statuses.count('pending'),
+                'running': statuses.count('running'),
+                'done': statuses.count('done'),
+                'failed': statuses.count('failed'),
+                'attempts': sum(job['attempts'] for job in self.jobs.values()),
+            }
+
+
+def make_handler(coordinator):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+        def _send(self, code, data=None):
+            body = json.dumps(data, default=str).encode() if data is not None else b''
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/status':
+                return self._send(200, coordinator.status())
+            self._send(404)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            data = json.loads(self.rfile.read(length) or b'{}')
+            if self.path == '/lease':
+                job, finished = coordinator.lease(data['worker_id'], data['host'])
+                if finished:
+                    return self._send(410)
+                if job is None:
+                    return self._send(204)
+                return self._send(200, job)
+            if self.path == '/heartbeat':
+                return self._send(200 if coordinator.heartbeat(data['lease_id']) else 409)
+            if self.path == '/result':
+                accepted = coordinator.complete(
+                    lease_id=data['lease_id'],
+                    ok=data['ok'],
+                    result=data.get('result'),
+                    fingerprint=data.get('host'),
+                    error=data.get('error'),
+                )
+                return self._send(200 if accepted else 409)
+            self._send(404)
+
+    return Handler
+
+
+class Worker:
+    """Pull jobs from a coordinator and push back results."""
+    def __init__(self, url, hostname=None, concurrency=1, verbosity=1):
+        self.url = url.rstrip('/')
+        self.hostname = hostname or socket.gethostname()
+        self.concurrency = concurrency
+        self.verbosity = verbosity
+        self.sysinfo = sysinfo.get_sysinfo()
+        self.fingerprint = {**sysinfo.summarize(self.sysinfo), 'host_hostname': self.hostname}
+        self.session = requests.Session()
+        self.completed = 0
+        self.failed = 0
+
+    def _post(self, path, data):
+        return self.session.post(f"{self.url}{path}", json=data, timeout=30)
+
+    def _heartbeat(self, lease, stop):
+        interval = max(lease['lease_timeout'] / 3, 1)
+        while not stop.wait(interval):
+            try:
+                response = self._post('/heartbeat', {'lease_id': lease['lease_id']})
+            except requests.RequestException as err:
+                logger.warning("Heartbeat failed: %s", err)
+                continue
+            if response.status_code != 200:
+                logger.warning("Lost lease of job #%s", lease['job_id'])
+                return
+
+    def run_job(self, lease):
+        spec = {'verbosity': self.verbosity, **lease['spec']}
+        try:
+            # Fail fast on jobs this host cannot run, another host may take it
+            sysinfo.validate_transcode(self.sysinfo, spec)
+            return True, transcode.transcode(**spec), None
+        except Exception as err:
+            logger.exception("Job #%s failed", lease['job_id'])
+            return False, None, repr(err)
+
+    def _loop(self, worker_id):
+        failures = 0
+        while True:
+            try:
+                response = self._post('/lease', {'worker_id': worker_id, 'host': self.hostname})
+                failures = 0
+            except requests.RequestException as err:
+                failures += 1
+                if failures >= CONNECT_RETRIES:
+                    logger.error("Cannot reach coordinator, stopping %s", worker_id)
+                    return
+                logger.warning("Cannot reach coordinator: %s", err)
+                time.sleep(POLL_INTERVAL)
+                continue
+            if response.status_code == 410:
+                return
+            if response.status_code != 200:
+                time.sleep(POLL_INTERVAL)
+                continue
+            lease = response.json()
+            logger.info("%s got job #%s", worker_id, lease['job_id'])
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=self._heartbeat, args=(lease, stop), daemon=True)
+            heartbeat.start()
+            try:
+                ok, result, error = self.run_job(lease)
+            finally:
+                stop.set()
+            ok = ok and bool(result) and result.get('error_count', 0) == 0
+            try:
+                self._post('/result', {
+                    'lease_id': lease['lease_id'],
+                    'ok': ok,
+                    'result': result,
+                    'error': error,
+                    'host': self.fingerprint,
+                })
+            except requests.RequestException as err:
+                # The lease will expire and the job will be retried
+                logger.warning("Cannot push result of job #%s: %s", lease['job_id'], err)
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._loop, args=(f"{self.hostname}-{os.getpid()}-{i}",))
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {
+            'hostname': self.hostname,
+            'completed': self.completed,
+            'failed': self.failed,
+        }
+
+
+def parse_host_limits(values):
+    limits = {}
+    for value in values:
+        host, _, limit = value.rpartition('=')
+        limits[host] = int(limit)
+    return limits
+
+
+def coordinate(
+    jobs,
+    host=HOST,
+    port=PORT,
+    local_workers=0,
+    verbosity=1,
+    **kwargs
+):
+    coordinator = Coordinator(jobs, **kwargs)
+    server = ThreadingHTTPServer((host, port), make_handler(coordinator))
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    logger.info("Coordinator listening on %s:%s", *server.server_address[:2])
+
+    workers = []
+    if local_workers:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        hostname = socket.gethostname()
+        # Local workers share this host, let them all run unless limited
+        if hostname not in coordinator.host_limits:
+            coordinator.host_limits[hostname] = max(local_workers, coordinator.default_host_limit)
+        worker = Worker(url, hostname=hostname, concurrency=local_workers, verbosity=verbosity)
+        workers.append(threading.Thread(target=worker.run))
+        workers[-1].start()
+
+    t0 = time.time()
+    while not coordinator.done.wait(POLL_INTERVAL):
+        coordinator.expire()
+    elapsed = time.time() - t0
+    for worker in workers:
+        worker.join()
+    server.shutdown()
+    server.server_close()
+    return {
+        **coordinator.status(),
+        'elapsed': elapsed,
+        'hosts': sorted({r['host']['host_hostname'] for r in coordinator.results if r['host']}),
+    }
+
+
+def main(args):
+    jobs = load_jobs(args.jobs) * args.repeat
+    if args.validate:
+        host_info = sysinfo.get_sysinfo()
+        for job in jobs:
+            sysinfo.validate_transcode(host_info, job)
+    results = coordinate(
+        jobs=jobs,
+        host=args.host,
+        port=args.port,
+        local_workers=args.local_workers,
+        results_file=args.results_file,
+        lease_timeout=args.lease_timeout,
+        max_attempts=args.max_attempts,
+        host_limits=parse_host_limits(args.host_limit),
+        default_host_limit=args.default_host_limit,
+        verbosity=args.verbosity,
+    )
+    return results
+
+
+def worker_main(args):
+    worker = Worker(
+        url=args.coordinator,
+        hostname=args.hostname,
+        concurrency=args.concurrency,
+        verbosity=args.verbosity,
+    )
+    return worker.run()
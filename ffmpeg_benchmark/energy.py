@@ -0,0 +1,114 @@
+import time
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger('ffmpeg_benchmark')
+
+POWERCAP_ROOT = Path('/sys/class/powercap')
+SAMPLE_INTERVAL = 1
+
+
+class RaplDomain:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.name = (self.path / 'name').read_text().strip()
+        self.max_energy = int((self.path / 'max_energy_range_uj').read_text())
+
+    @property
+    def kind(self):
+        if self.name.startswith('package'):
+            return 'package'
+        return self.name
+
+    def read(self):
+        return int((self.path / 'energy_uj').read_text())
+
+
+def get_rapl_domains():
+    """
+    Return the readable RAPL package and DRAM domains, an empty list if RAPL
+    is missing or restricted to root.
+    """
+    domains = []
+    for path in sorted(POWERCAP_ROOT.glob('intel-rapl:*')):
+        try:
+            domain = RaplDomain(path)
+            domain.read()
+        except (OSError, ValueError) as err:
+            logger.debug("Skipped RAPL domain %s: %s", path, err)
+            continue
+        if domain.kind in ('package', 'dram'):
+            domains.append(domain)
+    return domains
+
+
+class EnergyMeter:
+    """
+    Accumulate RAPL energy counters in a background thread.
+
+    Counters are read every ``interval`` seconds so wraparounds of
+    ``energy_uj`` are accounted for on long runs.
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.domains = get_rapl_domains()
+        self.energy = {}
+        self.elapsed = 0
+        self._last = {}
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def available(self):
+        return bool(self.domains)
+
+    def _sample(self):
+        for domain in self.domains:
+            value = domain.read()
+            delta = value - self._last[domain.path]
+            if delta < 0:
+                delta += domain.max_energy
+            self.energy[domain.kind] = self.energy.get(domain.kind, 0) + delta
+            self._last[domain.path] = value
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._last = {domain.path: domain.read() for domain in self.domains}
+        self.energy = {}
+        self._t0 = time.time()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        self.elapsed = time.time() - self._t0
+
+    def get_results(self):
+        """Energy in joules per domain kind, and average power."""
+        results = {
+            f"energy_{kind}_joules": value / 1e6
+            for kind, value in self.energy.items()
+        }
+        joules = sum(self.energy.values()) / 1e6
+        results.update({
+            'energy_joules': joules,
+            'power_mean_watts': joules / self.elapsed if self.elapsed else None,
+        })
+        return results
+
+
+def efficiency(joules, frames, size=None, prefix=''):
+    """Frames and encoded bytes per joule."""
+    if not joules:
+        return {}
+    results = {f'{prefix}frames_per_joule': frames / joules}
+    if size is not None:
+        results[f'{prefix}bytes_per_joule'] = size / joules
+    return results
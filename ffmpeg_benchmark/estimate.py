@@ -0,0 +1,371 @@
+import os
+import math
+import logging
+import subprocess
+from tempfile import TemporaryDirectory
+from concurrent.futures import ThreadPoolExecutor
+
+import ffmpeg
+
+from ffmpeg_benchmark import probe
+from ffmpeg_benchmark import transcode
+from ffmpeg_benchmark import vmaf
+from ffmpeg_benchmark import sysinfo
+
+logger = logging.getLogger('ffmpeg_benchmark')
+cmd_logger = logging.getLogger('ffmpeg_benchmark_cmd')
+
+SNIPPETS = 8
+# Snippets of each stratum, two give the variance within strata
+SNIPPETS_PER_STRATUM = 2
+SNIPPET_DURATION = 5
+ANALYSIS_WIDTH = 160
+ANALYSIS_CODEC = 'libx264'
+SCENE_THRESHOLD = 0.3
+# Two-sided 95% normal quantile, for the reported error bounds
+Z_95 = 1.96
+
+
+def make_parser(subparsers):
+    parser = subparsers.add_parser("estimate", help="Estimate transcoding performance from representative snippets")
+
+    parser.add_argument("--snippets", "-k", type=int, default=SNIPPETS, help="Number of snippets encoded, two per stratum of complexity")
+    parser.add_argument("--snippet-duration", type=float, default=SNIPPET_DURATION, help="Duration of each snippet in seconds")
+    parser.add_argument("--analysis-width", type=int, default=ANALYSIS_WIDTH, help="Width of the low resolution analysis pass")
+    parser.add_argument("--analysis-codec", default=ANALYSIS_CODEC, help="Encoder used to score frame complexity")
+    parser.add_argument("--parallel", type=int, default=1, help="Number of snippets encoded at once, FPS is biased above 1")
+    parser.add_argument("--score-workers", type=int, default=os.cpu_count(), help="Number of snippets scored at once")
+    parser.add_argument("--threads", type=int, help="Number of threads to use.")
+
+    parser.add_argument("--input", "-i", required=True)
+
+    parser.add_argument("--preset", help="Preset name", required=False, choices=transcode.PRESETS)
+    parser.add_argument("--crf", type=int, required=False, help="From 0 (loseless), max depends of codec")
+    parser.add_argument("--tune", required=False, choices=transcode.TUNES)
+
+    parser.add_argument('--output-scale', required=False)
+    parser.add_argument("--output-video-codec", '-oc:v', required=False)
+
+    parser.add_argument("--hwaccel", default="none")
+
+    parser.add_argument("--enable-vmaf", action="store_true")
+    parser.add_argument("--validate", action="store_true", help="Also run the full transcode and compare")
+
+
+def analyse(input, workdir, width=ANALYSIS_WIDTH, codec=ANALYSIS_CODEC):
+    """
+    Cheap low resolution pass returning, per frame in presentation order,
+    its timestamp, scene change score and encoded size.
+    """
+    metadata_file = os.path.join(workdir, 'analysis.txt')
+    stream = ffmpeg.input(input)
+    stream = stream.filter('scale', width, -2)
+    stream = stream.filter('select', 'gte(scene,0)')
+    stream = stream.filter('metadata', mode='print', file=metadata_file)
+    output_kwargs = {
+        'format': 'framecrc',
+        'an': None,
+        'c:v': codec,
+    }
+    if codec == 'libx264':
+        output_kwargs['preset'] = 'ultrafast'
+    output_stream = stream.output('pipe:', **output_kwargs)
+    cmd = ffmpeg.compile(output_stream)
+    cmd_logger.debug(' '.join(cmd))
+    logger.info("Started analysis of %s", input)
+    stdout = subprocess.run(cmd, capture_output=True, check=True).stdout.decode()
+
+    packets = []
+    for line in stdout.splitlines():
+        fields = [f.strip() for f in line.split(',')]
+        if line.startswith('#') or len(fields) < 6 or fields[0] != '0':
+            continue
+        packets.append((int(fields[2]), int(fields[4])))
+    sizes = [size for _, size in sorted(packets)]
+
+    frames = []
+    with open(metadata_file) as fd:
+        for line in fd:
+            if line.startswith('frame:'):
+                pts_time = line.split('pts_time:')[1].split()[0]
+                frames.append({'time': float(pts_time), 'scene': 0})
+            elif line.startswith('lavfi.scene_score=') and frames:
+                frames[-1]['scene'] = float(line.split('=')[1])
+    for frame, size in zip(frames, sizes):
+        frame['size'] = size
+    return frames[:len(sizes)]
+
+
+def make_windows(frames, duration):
+    """Split analysed frames in consecutive windows of ``duration`` seconds."""
+    windows = []
+    for frame in frames:
+        if not windows or frame['time'] >= windows[-1]['start'] + duration:
+            windows.append({'start': frame['time'], 'frames': []})
+        windows[-1]['frames'].append(frame)
+    for window in windows:
+        window_frames = window.pop('frames')
+        window['nb_frames'] = len(window_frames)
+        window['complexity'] = sum(f['size'] for f in window_frames) / len(window_frames)
+        window['scenes'] = sum(1 for f in window_frames if f['scene'] > SCENE_THRESHOLD)
+    return windows
+
+
+def select_snippets(windows, k, per_stratum=SNIPPETS_PER_STRATUM):
+    """
+    Split windows in strata of similar complexity and pick ``per_stratum``
+    windows of each, spread over its scene change density, ``k`` in total.
+    Each snippet weighs its share of the frames of its stratum.
+    """
+    windows = sorted(windows, key=lambda w: w['complexity'])
+    nb_strata = max(1, min(k, len(windows)) // per_stratum)
+    snippets = []
+    for i in range(nb_strata):
+        stratum = sorted(
+            windows[i * len(windows) // nb_strata:(i + 1) * len(windows) // nb_strata],
+            key=lambda w: (w['scenes'], w['complexity']),
+        )
+        count = min(per_stratum, k, len(stratum))
+        weight = sum(w['nb_frames'] for w in stratum)
+        for j in range(count):
+            snippets.append({
+                **stratum[(2 * j + 1) * len(stratum) // (2 * count)],
+                'stratum': i,
+                'weight': weight / count,
+            })
+    return sorted(snippets, key=lambda s: s['start'])
+
+
+def stratified_estimate(values, snippets):
+    """
+    Stratified mean of per-snippet ``values`` and the half-width of its
+    approximate 95% confidence interval, from the spread of values within
+    each stratum. Without a stratum of two snippets there is no bound.
+    """
+    total = sum(s['weight'] for s in snippets)
+    mean = sum(v * s['weight'] for v, s in zip(values, snippets)) / total
+    strata = {}
+    for value, snippet in zip(values, snippets):
+        strata.setdefault(snippet['stratum'], []).append((value, snippet['weight']))
+    if all(len(stratum) < 2 for stratum in strata.values()):
+        return mean, None
+    variance = 0
+    for stratum in strata.values():
+        # A stratum of a single window is fully sampled
+        if len(stratum) < 2:
+            continue
+        share = sum(w for _, w in stratum) / total
+        stratum_mean = sum(v for v, _ in stratum) / len(stratum)
+        sample_variance = sum((v - stratum_mean) ** 2 for v, _ in stratum) / (len(stratum) - 1)
+        variance += share ** 2 * sample_variance / len(stratum)
+    return mean, Z_95 * math.sqrt(variance)
+
+
+class Estimator:
+    def __init__(
+        self,
+        input,
+
+        snippets=SNIPPETS,
+        snippet_duration=SNIPPET_DURATION,
+        analysis_width=ANALYSIS_WIDTH,
+        analysis_codec=ANALYSIS_CODEC,
+        parallel=1,
+        score_workers=None,
+        threads=None,
+
+        preset=None,
+        crf=None,
+        tune=None,
+
+        output_scale=None,
+        output_video_codec=None,
+
+        hwaccel='none',
+
+        enable_vmaf=False,
+        validate=False,
+
+        verbosity=1,
+    ):
+        self.input = input
+
+        self.snippets = snippets
+        self.snippet_duration = snippet_duration
+        self.analysis_width = analysis_width
+        self.analysis_codec = analysis_codec
+        self.parallel = parallel
+        self.score_workers = score_workers or os.cpu_count()
+        self.threads = threads
+
+        self.preset = preset
+        self.crf = crf
+        self.tune = tune
+
+        self.output_scale = output_scale
+        self.output_video_codec = output_video_codec
+
+        self.hwaccel = hwaccel
+
+        self.enable_vmaf = enable_vmaf
+        self.validate = validate
+
+        self.verbosity = verbosity
+
+    def make_transcoder(self, output, start=None, duration=None):
+        return transcode.Transcoder(
+            input=self.input,
+            threads=self.threads,
+            input_start=start,
+            input_duration=duration,
+            preset=self.preset,
+            crf=self.crf,
+            tune=self.tune,
+            output=output,
+            output_scale=self.output_scale,
+            output_video_codec=self.output_video_codec,
+            output_disable_audio=True,
+            hwaccel=self.hwaccel,
+            verbosity=self.verbosity,
+        )
+
+    def encode(self, snippet, workdir):
+        snippet['output'] = os.path.join(workdir, f"snippet-{snippet['start']:.3f}.mkv")
+        transcoder = self.make_transcoder(
+            output=snippet['output'],
+            start=snippet['start'],
+            duration=self.snippet_duration,
+        )
+        result = transcoder.run()
+        if result['error_count']:
+            raise ValueError(f"Encoding of snippet at {snippet['start']}s failed")
+        snippet.update({
+            'elapsed': result['elapsed_mean'],
+            'encoded_frames': result['nb_frames'],
+            'size': result['output_size'],
+        })
+        return snippet
+
+    def score(self, snippet, workdir):
+        result = vmaf.vmaf(
+            ori_input=self.input,
+            new_input=snippet['output'],
+            stats_file=os.path.join(workdir, f"vmaf-{snippet['start']:.3f}.json"),
+            ori_start=snippet['start'],
+            ori_duration=self.snippet_duration,
+        )
+        snippet['vmaf'] = result['vmaf_mean']
+        return snippet
+
+    def run_full(self, workdir):
+        output = os.path.join(workdir, 'full.mkv')
+        result = self.make_transcoder(output=output).run()
+        actual = {
+            'fps': result['fps_mean'],
+            'size': result['output_size'],
+        }
+        if self.enable_vmaf:
+            actual['vmaf'] = vmaf.vmaf(
+                ori_input=self.input,
+                new_input=output,
+                stats_file=os.path.join(workdir, 'vmaf-full.json'),
+            )['vmaf_mean']
+        return actual
+
+    def run(self):
+        input_data = probe.extract_data(probe.probe(self.input))
+        nb_frames = input_data['video_nb_frames']
+        if nb_frames is None:
+            nb_frames = round(input_data['duration'] * input_data['video_frame_rate'])
+
+        with TemporaryDirectory() as workdir:
+            frames = analyse(self.input, workdir, width=self.analysis_width, codec=self.analysis_codec)
+            windows = make_windows(frames, self.snippet_duration)
+            snippets = select_snippets(windows, self.snippets)
+            logger.info("Selected snippets at %s", [s['start'] for s in snippets])
+
+            with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+                snippets = list(executor.map(lambda s: self.encode(s, workdir), snippets))
+            if self.enable_vmaf:
+                with ThreadPoolExecutor(max_workers=self.score_workers) as executor:
+                    snippets = list(executor.map(lambda s: self.score(s, workdir), snippets))
+            actual = self.run_full(workdir) if self.validate else None
+
+        results = {
+            'input': self.input,
+            **{f"input_{key}": value for key, value in input_data.items()},
+            'preset': self.preset,
+            'crf': self.crf,
+            'tune': self.tune,
+            'output_scale': self.output_scale,
+            'output_video_codec': self.output_video_codec,
+            'hwaccel': self.hwaccel,
+
+            'snippets': len(snippets),
+            'snippet_duration': self.snippet_duration,
+            'snippet_starts': [s['start'] for s in snippets],
+            'snippet_weights': [s['weight'] for s in snippets],
+            'strata': len({s['stratum'] for s in snippets}),
+            'analysed_frames': len(frames),
+            'encoded_frames': sum(s['encoded_frames'] for s in snippets),
+        }
+
+        # Time per frame extrapolates linearly, unlike FPS
+        spf, spf_bound = stratified_estimate([s['elapsed'] / s['encoded_frames'] for s in snippets], snippets)
+        results['fps_estimate'] = 1 / spf
+        bpf, bpf_bound = stratified_estimate([s['size'] / s['encoded_frames'] for s in snippets], snippets)
+        results['size_estimate'] = bpf * nb_frames
+        if spf_bound is not None:
+            results['fps_error_percent'] = spf_bound / spf * 100
+        if bpf_bound is not None:
+            results['size_error_percent'] = bpf_bound / bpf * 100
+        if self.enable_vmaf:
+            vmaf_mean, vmaf_bound = stratified_estimate([s['vmaf'] for s in snippets], snippets)
+            results['vmaf_estimate'] = vmaf_mean
+            results['vmaf_error'] = vmaf_bound
+
+        if actual is not None:
+            for key, value in actual.items():
+                estimate = results[f'{key}_estimate']
+                results[f'{key}_actual'] = value
+                results[f'{key}_estimate_deviation_percent'] = (estimate - value) / value * 100
+        return results
+
+
+def estimate(**kwargs):
+    estimator = Estimator(**kwargs)
+    results = estimator.run()
+    return results
+
+
+def main(args):
+    host_info = sysinfo.get_sysinfo()
+    sysinfo.validate_transcode(host_info, vars(args), enable_vmaf=args.enable_vmaf)
+    sysinfo.validate(host_info, encoders=[args.analysis_codec], filters=['select', 'metadata'])
+    results = estimate(
+        input=args.input,
+
+        snippets=args.snippets,
+        snippet_duration=args.snippet_duration,
+        analysis_width=args.analysis_width,
+        analysis_codec=args.analysis_codec,
+        parallel=args.parallel,
+        score_workers=args.score_workers,
+        threads=args.threads,
+
+        preset=args.preset,
+        crf=args.crf,
+        tune=args.tune,
+
+        output_scale=args.output_scale,
+        output_video_codec=args.output_video_codec,
+
+        hwaccel=args.hwaccel,
+
+        enable_vmaf=args.enable_vmaf,
+        validate=args.validate,
+
+        verbosity=args.verbosity,
+    )
+    results.update(sysinfo.summarize(host_info))
+    return results
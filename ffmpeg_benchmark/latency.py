@@ -0,0 +1,268 @@
+import re
+import time
+import logging
+import threading
+import subprocess
+from fractions import Fraction
+from typing import Any
+
+import ffmpeg
+import handystats
+
+from ffmpeg_benchmark import probe
+from ffmpeg_benchmark import transcode
+from ffmpeg_benchmark import utils
+from ffmpeg_benchmark import sysinfo
+
+logger = logging.getLogger('ffmpeg_benchmark')
+cmd_logger = logging.getLogger('ffmpeg_benchmark_cmd')
+
+RE_SHOWINFO = re.compile(r'\bn: *(\d+) +pts: *(-?\d+)')
+RE_TIMEBASE = re.compile(r'^#tb (\d+): (\d+)/(\d+)')
+
+
+def make_parser(subparsers):
+    parser = subparsers.add_parser("latency", help="Evaluate startup and per-frame encoding latency")
+
+    parser.add_argument("--threads", type=int, help="Number of threads to use.")
+
+    parser.add_argument("--input", "-i", required=True)
+    parser.add_argument("--realtime", "-re", action="store_true", help="Read input at its native frame rate, like a live source")
+
+    parser.add_argument("--preset", help="Preset name", required=False, choices=transcode.PRESETS)
+    parser.add_argument("--crf", type=int, required=False, help="From 0 (loseless), max depends of codec")
+    parser.add_argument("--tune", required=False, choices=transcode.TUNES)
+
+    parser.add_argument('--output-scale', required=False)
+    parser.add_argument('--output-video-bitrate', '-ob:v', required=False)
+    parser.add_argument("--output-video-codec", '-oc:v', required=False)
+
+    parser.add_argument("--hwaccel", default="none")
+
+
+class LatencyMeter:
+    """
+    Timestamp frames entering the encoder and packets leaving it.
+
+    Input frames are reported by a ``showinfo`` filter on stderr, output
+    packets by the ``framecrc`` muxer on stdout, flushed after each packet.
+    Frames and packets are matched by presentation order, so encoders
+    reordering frames are handled, but the encoder must not drop frames.
+    """
+    def __init__(
+        self,
+        input,
+
+        threads=None,
+        realtime=False,
+
+        preset=None,
+        crf=None,
+        tune=None,
+
+        output_scale=None,
+        output_video_bitrate=None,
+        output_video_codec=None,
+
+        hwaccel='none',
+
+        verbosity=1,
+    ):
+        self.input = input
+        self.threads = threads
+        self.realtime = realtime
+
+        self.preset = preset
+        self.crf = crf
+        self.tune = tune
+
+        self.output_scale = output_scale
+        self.output_video_bitrate = output_video_bitrate
+        self.output_video_codec = output_video_codec
+
+        self.hwaccel = hwaccel
+
+        self.verbosity = verbosity
+
+        self.input_times = []
+        self.output_packets = []
+        self.timebase = None
+        self.ffmpeg_version = None
+
+    @property
+    def input_probe(self):
+        if not hasattr(self, '_input_probe'):
+            self._input_probe = probe.probe(self.input)
+        return self._input_probe
+
+    @property
+    def input_probe_data(self):
+        if not hasattr(self, '_input_probe_data'):
+            self._input_probe_data = {
+                f"input_{key}": value
+                for key, value in probe.extract_data(self.input_probe).items()
+            }
+        return self._input_probe_data
+
+    def make_command(self):
+        input_kwargs: dict[str, Any] = {
+            'hwaccel': self.hwaccel,
+        }
+        if self.realtime:
+            input_kwargs['re'] = None
+        if self.threads is not None:
+            input_kwargs['threads'] = self.threads
+        stream = ffmpeg.input(self.input, **input_kwargs)
+        if self.output_scale:
+            stream = stream.filter(
+                'scale', size=self.output_scale,
+            )
+        stream = stream.filter('showinfo')
+
+        output_kwargs = {
+            'format': 'framecrc',
+            'flush_packets': 1,
+            'an': None,
+        }
+        if self.preset:
+            output_kwargs['preset'] = self.preset
+        if self.crf is not None:
+            output_kwargs['crf'] = self.crf
+        if self.tune:
+            output_kwargs['tune'] = self.tune
+        if self.output_video_bitrate:
+            output_kwargs['b:v'] = self.output_video_bitrate
+        if self.output_video_codec:
+            output_kwargs['c:v'] = self.output_video_codec
+        output_stream = stream.output('pipe:', **output_kwargs).global_args('-nostats')
+        return ffmpeg.compile(output_stream)
+
+    def read_stderr(self, fd):
+        for line in fd:
+            now = time.perf_counter()
+            line = line.decode(errors='replace')
+            if self.ffmpeg_version is None:
+                self.ffmpeg_version = utils.parse_version(line) or ''
+            if RE_SHOWINFO.search(line):
+                self.input_times.append(now)
+            elif self.verbosity >= 4:
+                logger.debug("stderr: %s", line.rstrip())
+
+    def read_stdout(self, fd):
+        for line in fd:
+            now = time.perf_counter()
+            line = line.decode()
+            if line.startswith('#'):
+                search = RE_TIMEBASE.search(line)
+                if search and search.group(1) == '0':
+                    self.timebase = Fraction(int(search.group(2)), int(search.group(3)))
+                continue
+            fields = [f.strip() for f in line.split(',')]
+            if len(fields) < 6 or fields[0] != '0':
+                continue
+            self.output_packets.append((int(fields[2]), int(fields[4]), now))
+
+    def run(self):
+        cmd = self.make_command()
+        cmd_logger.debug(' '.join(cmd))
+        logger.info("Started latency measurement")
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        readers = [
+            threading.Thread(target=self.read_stdout, args=(proc.stdout,)),
+            threading.Thread(target=self.read_stderr, args=(proc.stderr,)),
+        ]
+        for reader in readers:
+            reader.start()
+        proc.wait()
+        elapsed = time.perf_counter() - t0
+        for reader in readers:
+            reader.join()
+        if proc.returncode:
+            logger.error("ffmpeg exited with code %s", proc.returncode)
+
+        # Packets come out in decoding order, rank them by presentation order
+        arrivals = [t for _, _, t in sorted(self.output_packets)]
+        nb_matched = min(len(arrivals), len(self.input_times))
+        if len(arrivals) != len(self.input_times):
+            logger.warning(
+                "Got %s input frames for %s output packets, latencies may be shifted",
+                len(self.input_times), len(arrivals),
+            )
+        latencies = [
+            (arrivals[i] - self.input_times[i]) * 1000
+            for i in range(nb_matched)
+        ]
+        emit_times = [t for _, _, t in self.output_packets]
+        intervals = [
+            (emit_times[i] - emit_times[i-1]) * 1000
+            for i in range(1, len(emit_times))
+        ]
+        nb_frames = len(self.output_packets)
+
+        results = {
+            'ok': proc.returncode == 0,
+            'ffmpeg_version': self.ffmpeg_version,
+            'threads': self.threads,
+            'hwaccel': self.hwaccel,
+            'realtime': self.realtime,
+
+            'preset': self.preset,
+            'crf': self.crf,
+            'tune': self.tune,
+
+            'input': self.input,
+            **self.input_probe_data,
+
+            'output_scale': self.output_scale,
+            'output_video_bitrate': self.output_video_bitrate,
+            'output_video_codec': self.output_video_codec,
+            'output_timebase': str(self.timebase),
+            'output_nb_frames': nb_frames,
+            'output_size': sum(size for _, size, _ in self.output_packets),
+
+            'elapsed': elapsed,
+            'fps': nb_frames / elapsed,
+        }
+        if self.input_times:
+            results['time_to_first_input_frame'] = (self.input_times[0] - t0) * 1000
+        if emit_times:
+            results['time_to_first_frame'] = (emit_times[0] - t0) * 1000
+        if latencies:
+            results.update(handystats.full_stats(latencies, prefix='frame_latency_'))
+            results.update(utils.percentiles(latencies, prefix='frame_latency_'))
+        if intervals:
+            results.update(handystats.full_stats(intervals, prefix='frame_interval_'))
+            results.update(utils.percentiles(intervals, prefix='frame_interval_'))
+        return results
+
+
+def latency(**kwargs):
+    meter = LatencyMeter(**kwargs)
+    results = meter.run()
+    return results
+
+
+def main(args):
+    host_info = sysinfo.get_sysinfo()
+    sysinfo.validate_transcode(host_info, vars(args))
+    sysinfo.validate(host_info, filters=['showinfo'])
+    results = latency(
+        input=args.input,
+        threads=args.threads,
+        realtime=args.realtime,
+
+        preset=args.preset,
+        crf=args.crf,
+        tune=args.tune,
+
+        output_scale=args.output_scale,
+        output_video_bitrate=args.output_video_bitrate,
+        output_video_codec=args.output_video_codec,
+
+        hwaccel=args.hwaccel,
+
+        verbosity=args.verbosity,
+    )
+    results.update(sysinfo.summarize(host_info))
+    return results
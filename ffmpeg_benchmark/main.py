@@ -7,6 +7,14 @@ from ffmpeg_benchmark import probe
 from ffmpeg_benchmark import transcode
 from ffmpeg_benchmark import psnr
 from ffmpeg_benchmark import vmaf
+from ffmpeg_benchmark import pipeline
+from ffmpeg_benchmark import latency
+from ffmpeg_benchmark import distributed
+from ffmpeg_benchmark import sysinfo
+from ffmpeg_benchmark import estimate
+from ffmpeg_benchmark import breakdown
+from ffmpeg_benchmark import tune
+from ffmpeg_benchmark import streaming
 from ffmpeg_benchmark import __version__
 from ffmpeg_benchmark.loggers import set_logger
 
@@ -15,6 +23,15 @@ ACTIONS = {
     'transcode': transcode.main,
     'psnr': psnr.main,
     'vmaf': vmaf.main,
+    'pipeline': pipeline.main,
+    'latency': latency.main,
+    'coordinator': distributed.main,
+    'worker': distributed.worker_main,
+    'sysinfo': sysinfo.main,
+    'estimate': estimate.main,
+    'breakdown': breakdown.main,
+    'tune': tune.main,
+    'streaming': streaming.main,
 }
 
 
@@ -32,6 +49,14 @@ def main():
     transcode.make_parser(subparsers)
     psnr.make_parser(subparsers)
     vmaf.make_parser(subparsers)
+    pipeline.make_parser(subparsers)
+    latency.make_parser(subparsers)
+    distributed.make_parser(subparsers)
+    sysinfo.make_parser(subparsers)
+    estimate.make_parser(subparsers)
+    breakdown.make_parser(subparsers)
+    tune.make_parser(subparsers)
+    streaming.make_parser(subparsers)
 
     args = parser.parse_args()
     if not args.action:
@@ -0,0 +1,508 @@
+import os
+import time
+import fcntl
+import select
+import struct
+import termios
+import logging
+import threading
+import subprocess
+from tempfile import TemporaryFile
+from typing import Any
+
+import ffmpeg
+import handystats
+
+from ffmpeg_benchmark import probe
+from ffmpeg_benchmark import transcode
+from ffmpeg_benchmark import utils
+from ffmpeg_benchmark import sysinfo
+
+logger = logging.getLogger('ffmpeg_benchmark')
+cmd_logger = logging.getLogger('ffmpeg_benchmark_cmd')
+
+RE_BENCH = transcode.RE_BENCH
+
+MODES = (
+    'direct',
+    'splice',
+    'copy',
+)
+CHUNK_SIZE = 1024 * 1024
+SAMPLE_INTERVAL = 0.01
+
+
+def make_parser(subparsers):
+    parser = subparsers.add_parser("pipeline", help="Evaluate multi-process decode/encode pipeline")
+
+    parser.add_argument("--mode", default="direct", choices=MODES, help="direct: decoder writes into the encoder pipe, splice: zero-copy relay, copy: userspace relay")
+    parser.add_argument("--pipe-size", type=int, required=False, help="Pipe buffer size in bytes, set with F_SETPIPE_SZ")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Max bytes moved per relay operation")
+    parser.add_argument("--threads", type=int, help="Number of threads to use.")
+
+    parser.add_argument("--input", "-i", required=True)
+    parser.add_argument("--raw-pix-fmt", required=False, help="Pixel format of the raw frames, defaults to input's one")
+
+    parser.add_argument("--preset", help="Preset name", required=False, choices=transcode.PRESETS)
+    parser.add_argument("--crf", type=int, required=False, help="From 0 (loseless), max depends of codec")
+    parser.add_argument("--tune", required=False, choices=transcode.TUNES)
+
+    parser.add_argument("--output", "-o", default="/dev/null")
+    parser.add_argument('--output-format', "-f", required=False)
+    parser.add_argument('--output-scale', required=False)
+    parser.add_argument("--output-video-codec", '-oc:v', required=False)
+
+    parser.add_argument("--hwaccel", default="none")
+
+    parser.add_argument(
+        '--disable-baseline', action="store_false", dest="baseline_enabled",
+        help="Do not run the monolithic ffmpeg graph for comparison",
+    )
+
+
+def set_pipe_size(fd, size):
+    """
+    Resize a pipe buffer and return the size granted by the kernel, None
+    where pipes cannot be resized, like on macOS.
+    """
+    if not hasattr(fcntl, 'F_GETPIPE_SZ'):
+        return None
+    if size is not None:
+        fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, size)
+    return fcntl.fcntl(fd, fcntl.F_GETPIPE_SZ)
+
+
+def get_pipe_fill(fd):
+    buf = fcntl.ioctl(fd, termios.FIONREAD, struct.pack('i', 0))
+    return struct.unpack('i', buf)[0]
+
+
+def parse_bench(stderr, prefix):
+    results = {}
+    lines = stderr.splitlines()
+    if lines:
+        version = utils.parse_version(lines[0])
+        if version:
+            results['ffmpeg_version'] = version
+    for line in lines[1:]:
+        if line.startswith('bench:'):
+            results.update({
+                f"{prefix}{key}": value
+                for key, value in RE_BENCH.findall(line.split(': ')[1])
+            })
+    return results
+
+
+class PipeSampler(threading.Thread):
+    """Periodically sample how many bytes are waiting in a pipe."""
+    def __init__(self, fd, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.fd = fd
+        self.interval = interval
+        self.values = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.values.append(get_pipe_fill(self.fd))
+            except OSError:
+                break
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Relay(threading.Thread):
+    """Move raw frames from the decoder pipe to the encoder pipe.
+
+    Time blocked on reads means the decoder is the bottleneck, time blocked on
+    writes means the encoder pushes back.
+    """
+    def __init__(self, src_fd, dst_fd, mode='copy', chunk_size=CHUNK_SIZE):
+        super().__init__(daemon=True)
+        self.src_fd = src_fd
+        self.dst_fd = dst_fd
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.bytes = 0
+        self.read_wait = 0
+        self.write_wait = 0
+        self.error = None
+
+    def _splice(self):
+        src_poll = select.poll()
+        src_poll.register(self.src_fd, select.POLLIN)
+        dst_poll = select.poll()
+        dst_poll.register(self.dst_fd, select.POLLOUT)
+        while True:
+            t0 = time.perf_counter()
+            src_poll.poll()
+            self.read_wait += time.perf_counter() - t0
+            t0 = time.perf_counter()
+            dst_poll.poll()
+            moved = os.splice(self.src_fd, self.dst_fd, self.chunk_size)
+            self.write_wait += time.perf_counter() - t0
+            if not moved:
+                break
+            self.bytes += moved
+
+    def _copy(self):
+        buf = bytearray(self.chunk_size)
+        view = memoryview(buf)
+        while True:
+            t0 = time.perf_counter()
+            read = os.readv(self.src_fd, [buf])
+            self.read_wait += time.perf_counter() - t0
+            if not read:
+                break
+            t0 = time.perf_counter()
+            written = 0
+            while written < read:
+                written += os.write(self.dst_fd, view[written:read])
+            self.write_wait += time.perf_counter() - t0
+            self.bytes += read
+
+    def run(self):
+        try:
+            if self.mode == 'splice':
+                self._splice()
+            else:
+                self._copy()
+        except OSError as err:
+            self.error = err
+            # Keep draining so the decoder does not block on a full pipe
+            while os.read(self.src_fd, self.chunk_size):
+                pass
+        finally:
+            os.close(self.dst_fd)
+
+
+class Pipeline:
+    def __init__(
+        self,
+        input,
+
+        mode='direct',
+        pipe_size=None,
+        chunk_size=CHUNK_SIZE,
+        threads=None,
+        raw_pix_fmt=None,
+
+        preset=None,
+        crf=None,
+        tune=None,
+
+        output='/dev/null',
+        output_format=None,
+        output_scale=None,
+        output_video_codec=None,
+
+        hwaccel='none',
+        baseline_enabled=True,
+
+        verbosity=1,
+    ):
+        if mode == 'splice' and not hasattr(os, 'splice'):
+            raise ValueError("splice mode is not supported on this platform")
+        if pipe_size is not None and not hasattr(fcntl, 'F_SETPIPE_SZ'):
+            raise ValueError("--pipe-size is not supported on this platform")
+        self.input = input
+
+        self.mode = mode
+        self.pipe_size = pipe_size
+        self.chunk_size = chunk_size
+        self.threads = threads
+        self.raw_pix_fmt = raw_pix_fmt
+
+        self.preset = preset
+        self.crf = crf
+        self.tune = tune
+
+        self.output = output
+        self.output_format = output_format
+        self.output_scale = output_scale
+        self.output_video_codec = output_video_codec
+
+        self.hwaccel = hwaccel
+        self.baseline_enabled = baseline_enabled
+
+        self.verbosity = verbosity
+
+    @property
+    def input_probe(self):
+        if not hasattr(self, '_input_probe'):
+            self._input_probe = probe.probe(self.input)
+        return self._input_probe
+
+    @property
+    def input_probe_data(self):
+        if not hasattr(self, '_input_probe_data'):
+            self._input_probe_data = {
+                f"input_{key}": value
+                for key, value in probe.extract_data(self.input_probe).items()
+            }
+        return self._input_probe_data
+
+    @property
+    def input_video_stream(self):
+        return next(
+            stream for stream in self.input_probe['streams']
+            if stream['codec_type'] == 'video'
+        )
+
+    def make_decoder(self, pix_fmt):
+        input_kwargs = {
+            'hwaccel': self.hwaccel,
+        }
+        if self.threads is not None:
+            input_kwargs['threads'] = self.threads
+        stream = ffmpeg.input(self.input, **input_kwargs)
+        output_stream = stream.output(
+            'pipe:',
+            format='rawvideo',
+            pix_fmt=pix_fmt,
+            an=None,
+            benchmark=None,
+        )
+        return output_stream
+
+    def make_encoder(self, pix_fmt):
+        video = self.input_video_stream
+        stream = ffmpeg.input(
+            'pipe:',
+            format='rawvideo',
+            pix_fmt=pix_fmt,
+            s=f"{video['width']}x{video['height']}",
+            framerate=video['r_frame_rate'],
+        )
+        if self.output_scale:
+            stream = stream.filter(
+                'scale', size=self.output_scale,
+            )
+        output_kwargs: dict[str, Any] = {
+            'benchmark': None,
+        }
+        if self.threads is not None:
+            output_kwargs['threads'] = self.threads
+        if self.preset:
+            output_kwargs['preset'] = self.preset
+        if self.crf is not None:
+            output_kwargs['crf'] = self.crf
+        if self.tune:
+            output_kwargs['tune'] = self.tune
+        if self.output_video_codec:
+            output_kwargs['c:v'] = self.output_video_codec
+        if self.output == '/dev/null':
+            output_kwargs['format'] = self.output_format or 'null'
+        return stream.output(self.output, **output_kwargs)
+
+    def run_baseline(self):
+        transcoder = transcode.Transcoder(
+            input=self.input,
+            threads=self.threads,
+            preset=self.preset,
+            crf=self.crf,
+            tune=self.tune,
+            output=self.output,
+            output_format=self.output_format,
+            output_scale=self.output_scale,
+            output_video_codec=self.output_video_codec,
+            output_disable_audio=True,
+            output_threads=self.threads,
+            hwaccel=self.hwaccel,
+            verbosity=self.verbosity,
+        )
+        return transcoder.run()
+
+    def run_pipeline(self):
+        pix_fmt = self.raw_pix_fmt or self.input_video_stream['pix_fmt']
+        decoder_cmd = ffmpeg.compile(self.make_decoder(pix_fmt), overwrite_output=True)
+        encoder_cmd = ffmpeg.compile(self.make_encoder(pix_fmt), overwrite_output=True)
+        cmd_logger.debug(' '.join(decoder_cmd))
+        cmd_logger.debug(' '.join(encoder_cmd))
+
+        dec_read, dec_write = os.pipe()
+        pipe_size = set_pipe_size(dec_write, self.pipe_size)
+        relay = None
+        if self.mode == 'direct':
+            enc_read, enc_write = dec_read, None
+        else:
+            enc_read, enc_write = os.pipe()
+            set_pipe_size(enc_write, self.pipe_size)
+        logger.debug("Pipe size: %s", pipe_size)
+
+        stage_elapseds = {}
+
+        def _wait(name, proc, t0):
+            proc.wait()
+            stage_elapseds[name] = time.perf_counter() - t0
+
+        def _wait_encoder(t0):
+            _wait('encode', encoder, t0)
+            if enc_write is None:
+                # Nothing else drains the decoder pipe, a decoder still
+                # writing would block forever: close it to raise EPIPE
+                samplers['decode'].stop()
+                os.close(dec_read)
+            if encoder.returncode and decoder.poll() is None:
+                decoder.kill()
+
+        with TemporaryFile() as dec_stderr, TemporaryFile() as enc_stderr:
+            logger.info("Started %s pipeline", self.mode)
+            t0 = time.perf_counter()
+            decoder = subprocess.Popen(decoder_cmd, stdout=dec_write, stderr=dec_stderr)
+            encoder = subprocess.Popen(encoder_cmd, stdin=enc_read, stderr=enc_stderr)
+            # Keep the read end the encoder consumes from for fill sampling,
+            # until the encoder exits
+            os.close(dec_write)
+            if enc_write is not None:
+                os.close(enc_read)
+                relay = Relay(dec_read, enc_write, mode=self.mode, chunk_size=self.chunk_size)
+                relay.start()
+            samplers = {'decode': PipeSampler(dec_read)}
+            if enc_write is not None:
+                samplers['encode'] = PipeSampler(enc_write)
+            for sampler in samplers.values():
+                sampler.start()
+            waiters = [
+                threading.Thread(target=_wait, args=('decode', decoder, t0)),
+                threading.Thread(target=_wait_encoder, args=(t0,)),
+            ]
+            for waiter in waiters:
+                waiter.start()
+            for waiter in waiters:
+                waiter.join()
+            elapsed = time.perf_counter() - t0
+            for sampler in samplers.values():
+                sampler.stop()
+            if relay is not None:
+                relay.join()
+                os.close(dec_read)
+
+            dec_stderr.seek(0)
+            enc_stderr.seek(0)
+            dec_output = dec_stderr.read().decode(errors='replace')
+            enc_output = enc_stderr.read().decode(errors='replace')
+
+        if self.verbosity >= 4:
+            logger.debug("decoder stderr: %s", dec_output)
+            logger.debug("encoder stderr: %s", enc_output)
+        ok = decoder.returncode == 0 and encoder.returncode == 0
+        if not ok:
+            logger.error("decoder stderr: %s", dec_output)
+            logger.error("encoder stderr: %s", enc_output)
+
+        results = {
+            'ok': ok,
+            'elapsed': elapsed,
+            'pipe_size': pipe_size,
+            'decode_elapsed': stage_elapseds['decode'],
+            'encode_elapsed': stage_elapseds['encode'],
+            **parse_bench(dec_output, 'decode_'),
+            **parse_bench(enc_output, 'encode_'),
+        }
+        for name, sampler in samplers.items():
+            if pipe_size is None:
+                results.update(handystats.full_stats(
+                    sampler.values or [0],
+                    prefix=f'{name}_pipe_fill_bytes_',
+                ))
+                continue
+            results.update(handystats.full_stats(
+                [v / pipe_size * 100 for v in sampler.values] or [0],
+                prefix=f'{name}_pipe_fill_percent_',
+            ))
+        if relay is not None:
+            if relay.error is not None:
+                logger.error("Relay failed: %s", relay.error)
+                results['ok'] = False
+            results.update({
+                'relay_bytes': relay.bytes,
+                'relay_read_wait': relay.read_wait,
+                'relay_write_wait': relay.write_wait,
+                'relay_throughput': relay.bytes / elapsed,
+            })
+        return results
+
+    def run(self):
+        in_nb_frames = self.input_probe_data['input_video_nb_frames']
+        pipeline_results = self.run_pipeline()
+        elapsed = pipeline_results['elapsed']
+
+        results = {
+            'mode': self.mode,
+            'chunk_size': self.chunk_size if self.mode != 'direct' else None,
+            'threads': self.threads,
+            'hwaccel': self.hwaccel,
+
+            'preset': self.preset,
+            'crf': self.crf,
+            'tune': self.tune,
+
+            'input': self.input,
+            **self.input_probe_data,
+
+            'output': self.output,
+            'output_format': self.output_format,
+            'output_scale': self.output_scale,
+            'output_video_codec': self.output_video_codec,
+
+            **pipeline_results,
+            'fps': in_nb_frames / elapsed,
+            # The decoder is paced by the encoder reading the pipe
+            'decode_process_fps': in_nb_frames / pipeline_results['decode_elapsed'],
+            'encode_fps': in_nb_frames / pipeline_results['encode_elapsed'],
+        }
+
+        if self.baseline_enabled:
+            baseline = self.run_baseline()
+            if baseline['error_count']:
+                logger.warning("Baseline run failed, skipping comparison")
+            else:
+                baseline_elapsed = baseline['elapsed_mean']
+                results.update({
+                    'baseline_elapsed': baseline_elapsed,
+                    'baseline_fps': in_nb_frames / baseline_elapsed,
+                    'overhead': elapsed - baseline_elapsed,
+                    'overhead_percent': (elapsed - baseline_elapsed) / baseline_elapsed * 100,
+                })
+        return results
+
+
+def pipeline(**kwargs):
+    runner = Pipeline(**kwargs)
+    results = runner.run()
+    return results
+
+
+def main(args):
+    host_info = sysinfo.get_sysinfo()
+    sysinfo.validate_transcode(host_info, vars(args))
+    results = pipeline(
+        input=args.input,
+
+        mode=args.mode,
+        pipe_size=args.pipe_size,
+        chunk_size=args.chunk_size,
+        threads=args.threads,
+        raw_pix_fmt=args.raw_pix_fmt,
+
+        preset=args.preset,
+        crf=args.crf,
+        tune=args.tune,
+
+        output=args.output,
+        output_format=args.output_format,
+        output_scale=args.output_scale,
+        output_video_codec=args.output_video_codec,
+
+        hwaccel=args.hwaccel,
+        baseline_enabled=args.baseline_enabled,
+
+        verbosity=args.verbosity,
+    )
+    results.update(sysinfo.summarize(host_info))
+    return results
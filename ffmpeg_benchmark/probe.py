@@ -1,5 +1,10 @@
+import os
+from fractions import Fraction
+
 import ffmpeg
 
+_cache = {}
+
 
 def make_parser(subparsers):
     parser = subparsers.add_parser("probe", help="Get info about an input")
@@ -7,11 +12,40 @@ def make_parser(subparsers):
     parser.add_argument("--input", "-i", required=True)
 
 
+def get_cache_key(input):
+    try:
+        stat = os.stat(input)
+    except (OSError, TypeError, ValueError):
+        return None
+    return (str(input), stat.st_mtime_ns, stat.st_size)
+
+
 def probe(input):
+    """Probe an input, results of local files are cached until they change."""
+    key = get_cache_key(input)
+    if key is not None and key in _cache:
+        return _cache[key]
     probe = ffmpeg.probe(input)
+    if key is not None:
+        _cache[key] = probe
     return probe
 
 
+def parse_frame_rate(stream):
+    for key in ('r_frame_rate', 'avg_frame_rate'):
+        value = stream.get(key, '0/0')
+        numerator, _, denominator = value.partition('/')
+        if int(numerator) and int(denominator or 1):
+            return float(Fraction(int(numerator), int(denominator or 1)))
+    return None
+
+
+def get_int(stream, key):
+    """Integer field of a stream, None if ffprobe did not report it."""
+    value = stream.get(key)
+    return int(value) if value is not None else None
+
+
 def extract_data(probe):
     fmt = probe['format']
     data = {
@@ -30,12 +64,14 @@ def extract_data(probe):
     ), None)
     if video is not None:
         data.update({
-            'video_bit_rate': video['bit_rate'],
+            'video_bit_rate': video.get('bit_rate'),
             'video_codec_name': video['codec_name'],
             'video_height': video['height'],
             'video_width': video['width'],
             'video_pix_fmt': video['pix_fmt'],
-            'video_nb_frames': int(video['nb_frames']),
+            # Matroska and WebM streams have no bit rate nor frame count
+            'video_nb_frames': get_int(video, 'nb_frames'),
+            'video_frame_rate': parse_frame_rate(video),
         })
 
     audio = next((
@@ -44,10 +80,13 @@ def extract_data(probe):
     ), None)
     if audio is not None:
         data.update({
-            'audio_bit_rate': audio['bit_rate'],
+            'audio_bit_rate': audio.get('bit_rate'),
             'audio_codec_name': audio['codec_name'],
-            'audio_nb_frames': int(audio['nb_frames']),
+            'audio_nb_frames': get_int(audio, 'nb_frames'),
             'audio_sample_rate': int(audio['sample_rate']),
+            'audio_channels': audio.get('channels'),
+            'audio_channel_layout': audio.get('channel_layout'),
+            'audio_duration': float(audio.get('duration', fmt['duration'])),
         })
     return data
 
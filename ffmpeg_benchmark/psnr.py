@@ -4,6 +4,8 @@ import logging
 import ffmpeg
 import handystats
 from ffmpeg_benchmark import probe
+from ffmpeg_benchmark import corpus
+from ffmpeg_benchmark import sysinfo
 
 logger = logging.getLogger('ffmpeg_benchmark')
 cmd_logger = logging.getLogger('ffmpeg_benchmark_cmd')
@@ -18,6 +20,7 @@ def make_parser(subparsers):
     parser.add_argument("--original-input", "-i", required=True)
     parser.add_argument("--new-input", "-I", required=True)
     parser.add_argument("--stats-file", default=STATS_FILE)
+    corpus.add_arguments(parser)
 
 
 def psnr(
@@ -104,10 +107,29 @@ def psnr(
     }
 
 
-def main(args):
+def run(args):
     results = psnr(
         ori_input=args.original_input,
         new_input=args.new_input,
         stats_file=args.stats_file,
     )
     return results
+
+
+def make_title_args(args, entry):
+    args.original_input = entry['input']
+    args.new_input = entry['new_input']
+    args.stats_file = corpus.title_filename(args.stats_file, entry['name'])
+    return args
+
+
+def main(args):
+    host_info = sysinfo.get_sysinfo()
+    sysinfo.validate(host_info, filters=['psnr'])
+    if corpus.is_corpus(args.original_input):
+        entries = corpus.pair_inputs(args.original_input, args.new_input)
+        results = corpus.run(entries, run, make_title_args, args)
+    else:
+        results = run(args)
+    results.update(sysinfo.summarize(host_info))
+    return results
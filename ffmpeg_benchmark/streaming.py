@@ -0,0 +1,697 @@
+import os
+import re
+import time
+import socket
+import logging
+import threading
+import subprocess
+from collections import deque
+from tempfile import TemporaryDirectory
+from typing import Any, cast
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ffmpeg
+import handystats
+
+from ffmpeg_benchmark import probe
+from ffmpeg_benchmark import transcode
+from ffmpeg_benchmark import breakdown
+from ffmpeg_benchmark import utils
+from ffmpeg_benchmark import sysinfo
+
+logger = logging.getLogger('ffmpeg_benchmark')
+cmd_logger = logging.getLogger('ffmpeg_benchmark_cmd')
+
+INPUT_TRANSPORTS = (
+    'file',
+    'http',
+    'udp',
+)
+OUTPUT_TRANSPORTS = (
+    'null',
+    'hls',
+    'dash',
+)
+HOST = '127.0.0.1'
+CHUNK_SIZE = 64 * 1024
+# 7 MPEG-TS packets, the usual payload of a UDP datagram
+UDP_PACKET_SIZE = 7 * 188
+# Microseconds without data before ffmpeg considers the UDP input ended
+UDP_TIMEOUT = 2000000
+# Seconds left to ffmpeg to bind the UDP port before sending
+UDP_STARTUP = 0.5
+SEGMENT_DURATION = 4
+STATS_PERIOD = 0.5
+PLAYLIST_EXTENSIONS = ('.m3u8', '.mpd')
+RE_OVERRUN = re.compile(r'overrun', re.IGNORECASE)
+TAIL_SIZE = 20
+
+
+def make_parser(subparsers):
+    parser = subparsers.add_parser("streaming", help="Evaluate transcoding over network transports with local stand-ins")
+
+    parser.add_argument("--threads", type=int, help="Number of threads to use.")
+
+    parser.add_argument("--input", "-i", required=True, help="Local file served by the input stand-in")
+    parser.add_argument("--input-transport", default="http", choices=INPUT_TRANSPORTS)
+    parser.add_argument("--input-disable-audio", action='store_true')
+    parser.add_argument("--input-thread-queue-size", type=int, nargs='+', help="Max number of queued input packets, several values run a sweep")
+
+    parser.add_argument("--bandwidth", help="Bandwidth of the stand-ins, like 20M bits/s, UDP input is sent at this rate instead of realtime")
+    parser.add_argument("--latency", type=float, default=0, help="Milliseconds added before each HTTP response")
+    parser.add_argument("--udp-buffer-size", type=int, help="Socket receive buffer of the UDP input, in bytes")
+    parser.add_argument("--udp-fifo-size", type=int, help="Circular buffer of the UDP input, in 188 bytes packets")
+
+    parser.add_argument("--preset", help="Preset name", required=False, choices=transcode.PRESETS)
+    parser.add_argument("--crf", type=int, required=False, help="From 0 (loseless), max depends of codec")
+    parser.add_argument("--tune", required=False, choices=transcode.TUNES)
+
+    parser.add_argument("--output-transport", default="hls", choices=OUTPUT_TRANSPORTS)
+    parser.add_argument('--output-scale', required=False)
+    parser.add_argument("--output-video-codec", '-oc:v', required=False)
+    parser.add_argument("--output-disable-audio", action="store_true")
+    parser.add_argument("--output-thread-queue-size", type=int, required=False, help="Max number of packets that may be queued to each muxing thread.")
+    parser.add_argument("--segment-duration", type=float, default=SEGMENT_DURATION, help="Duration of HLS or DASH segments in seconds")
+
+    parser.add_argument("--hwaccel", default="none")
+    parser.add_argument("--stats-period", type=float, default=STATS_PERIOD, help="Seconds between progress reports, the resolution of stalls")
+
+
+def get_free_port(kind=socket.SOCK_STREAM):
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+class Shaper:
+    """
+    Emulate a link shared by all connections of a stand-in: each transfer
+    waits for its turn at ``bandwidth`` bits/s, each response for
+    ``latency`` seconds.
+    """
+    def __init__(self, bandwidth=None, latency=0.0):
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def consume(self, size):
+        if not self.bandwidth:
+            return
+        with self._lock:
+            now = time.perf_counter()
+            self._next = max(now, self._next) + size * 8 / self.bandwidth
+            wait = self._next - now
+        time.sleep(wait)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """HTTP server giving its handlers access to their stand-in."""
+    # Closing the server waits for the handlers, so their counts are final
+    daemon_threads = False
+
+    def __init__(self, stand_in, handler):
+        super().__init__((HOST, 0), handler)
+        self.stand_in = stand_in
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    @property
+    def stand_in(self):
+        return cast(StandInServer, self.server).stand_in
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class StandIn:
+    """An HTTP stand-in served in a background thread."""
+    def __init__(self, handler, shaper):
+        self.shaper = shaper
+        self.server = StandInServer(self, handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{HOST}:{self.server.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class FileHandler(StandInHandler):
+    """Serve the stand-in's file, with range requests for seeking demuxers."""
+    def do_GET(self):
+        stand_in = self.stand_in
+        size = os.path.getsize(stand_in.filename)
+        start, end = 0, size - 1
+        range_ = self.headers.get('Range', '')
+        if range_.startswith('bytes='):
+            first, _, last = range_[6:].split(',')[0].partition('-')
+            start = int(first or 0)
+            end = min(int(last), end) if last else end
+        if start >= size:
+            self.send_response(416)
+            self.send_header('Content-Range', f"bytes */{size}")
+            self.end_headers()
+            return
+        stand_in.shaper.delay()
+        self.send_response(206 if range_ else 200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        if range_:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        stand_in.record_request()
+        with open(stand_in.filename, 'rb') as fd:
+            fd.seek(start)
+            remaining = end - start + 1
+            try:
+                while remaining > 0:
+                    data = fd.read(min(CHUNK_SIZE, remaining))
+                    stand_in.shaper.consume(len(data))
+                    self.wfile.write(data)
+                    stand_in.record_sent(len(data))
+                    remaining -= len(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # Demuxers drop connections when seeking
+                logger.debug("Client closed connection at %s", end - remaining + 1)
+
+
+class FileServer(StandIn):
+    def __init__(self, filename, shaper):
+        super().__init__(FileHandler, shaper)
+        self.filename = filename
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_sent(self, size):
+        with self._lock:
+            self.bytes_sent += size
+
+    def get_results(self, elapsed):
+        return {
+            'http_requests': self.requests,
+            'http_bytes': self.bytes_sent,
+            'http_throughput': self.bytes_sent * 8 / elapsed,
+        }
+
+
+class SinkHandler(StandInHandler):
+    """Accept HLS/DASH uploads, chunked or not, and time each of them."""
+    def read_body(self):
+        shaper = self.stand_in.shaper
+        size = 0
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                line = self.rfile.readline()
+                chunk_size = int(line.split(b';')[0].strip() or b'0', 16)
+                if not chunk_size:
+                    self.rfile.readline()
+                    break
+                shaper.consume(chunk_size)
+                size += len(self.rfile.read(chunk_size))
+                self.rfile.readline()
+        else:
+            remaining = int(self.headers.get('Content-Length', 0))
+            while remaining > 0:
+                data = self.rfile.read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                shaper.consume(len(data))
+                size += len(data)
+                remaining -= len(data)
+        return size
+
+    def do_PUT(self):
+        t0 = time.perf_counter()
+        size = self.read_body()
+        self.stand_in.shaper.delay()
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        self.stand_in.record(self.path, size, t0, time.perf_counter())
+
+    do_POST = do_PUT
+
+    def do_DELETE(self):
+        self.send_response(204)
+        self.end_headers()
+
+
+class SegmentSink(StandIn):
+    def __init__(self, shaper):
+        super().__init__(SinkHandler, shaper)
+        self.uploads = []
+        self._lock = threading.Lock()
+
+    def record(self, path, size, start, end):
+        with self._lock:
+            self.uploads.append({
+                'path': path,
+                'size': size,
+                'start': start,
+                'end': end,
+                'is_playlist': path.split('?')[0].endswith(PLAYLIST_EXTENSIONS),
+            })
+
+    def get_results(self, elapsed):
+        segments = sorted(
+            (u for u in self.uploads if not u['is_playlist']),
+            key=lambda u: u['end'],
+        )
+        results = {
+            'sink_bytes': sum(u['size'] for u in self.uploads),
+            'sink_throughput': sum(u['size'] for u in self.uploads) * 8 / elapsed,
+            'playlist_writes': len(self.uploads) - len(segments),
+            'segments': len(segments),
+        }
+        if segments:
+            write_times = [(u['end'] - u['start']) * 1000 for u in segments]
+            results.update(handystats.full_stats(write_times, prefix='segment_write_time_'))
+            results.update(utils.percentiles(write_times, prefix='segment_write_time_'))
+            results.update(handystats.full_stats([u['size'] for u in segments], prefix='segment_size_'))
+        if len(segments) > 1:
+            intervals = [
+                (segments[i]['end'] - segments[i-1]['end']) * 1000
+                for i in range(1, len(segments))
+            ]
+            results.update(handystats.full_stats(intervals, prefix='segment_interval_'))
+        return results
+
+
+class UdpSender:
+    """
+    Send an MPEG-TS file to a local port at its own bitrate, or at a fixed
+    one, like a multicast source would.
+    """
+    def __init__(self, filename, port, rate):
+        self.filename = filename
+        self.port = port
+        self.rate = rate
+        self.packets = 0
+        self.late = 0
+        self.elapsed = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _run(self):
+        interval = UDP_PACKET_SIZE * 8 / self.rate
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock, open(self.filename, 'rb') as fd:
+            t0 = time.perf_counter()
+            while True:
+                data = fd.read(UDP_PACKET_SIZE)
+                if not data or self._stop.is_set():
+                    break
+                wait = t0 + self.packets * interval - time.perf_counter()
+                if wait > 0:
+                    self._stop.wait(wait)
+                elif wait < -interval:
+                    self.late += 1
+                sock.sendto(data, (HOST, self.port))
+                self.packets += 1
+            self.elapsed = time.perf_counter() - t0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def join(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def stop(self):
+        self._stop.set()
+        self.join()
+
+    def get_results(self):
+        return {
+            'udp_rate': self.rate,
+            'udp_packets': self.packets,
+            'udp_late_packets': self.late,
+            'udp_send_time': self.elapsed,
+        }
+
+
+def get_stalls(frames, period):
+    """
+    Count stalls, runs of progress reports without new frames, and their
+    total duration. Reports after the last frame are the end of the input,
+    not a stall.
+    """
+    stalls = 0
+    stall_time = 0
+    stalled = False
+    current = 0
+    for (prev_t, prev_frame), (t, frame) in zip(frames, frames[1:]):
+        if frame == prev_frame and prev_frame:
+            stalled = True
+            current += t - prev_t
+        elif stalled:
+            stalls += 1
+            stall_time += current
+            stalled = False
+            current = 0
+    return {
+        'stalls': stalls,
+        'stall_time': stall_time,
+        'stats_period': period,
+    }
+
+
+def get_last_frame_time(frames):
+    """Time of the first progress report with the final frame count."""
+    nb_frames = frames[-1][1]
+    return next(t for t, frame in frames if frame == nb_frames)
+
+
+class StreamingBench:
+    """
+    Run a transcode reading from and writing to local network stand-ins.
+
+    Progress is reported every ``stats_period`` seconds, a stall is a run
+    of reports without new frames once the first frame is out.
+    """
+    def __init__(
+        self,
+        input,
+
+        threads=None,
+
+        input_transport='http',
+        input_disable_audio=False,
+        input_thread_queue_size=None,
+
+        bandwidth=None,
+        latency=0,
+        udp_buffer_size=None,
+        udp_fifo_size=None,
+
+        preset=None,
+        crf=None,
+        tune=None,
+
+        output_transport='hls',
+        output_scale=None,
+        output_video_codec=None,
+        output_disable_audio=None,
+        output_thread_queue_size=None,
+        segment_duration=SEGMENT_DURATION,
+
+        hwaccel='none',
+        stats_period=STATS_PERIOD,
+
+        verbosity=1,
+    ):
+        self.input = input
+        self.threads = threads
+
+        self.input_transport = input_transport
+        self.input_disable_audio = input_disable_audio
+        self.input_thread_queue_size = input_thread_queue_size
+
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.udp_buffer_size = udp_buffer_size
+        self.udp_fifo_size = udp_fifo_size
+
+        self.preset = preset
+        self.crf = crf
+        self.tune = tune
+
+        self.output_transport = output_transport
+        self.output_scale = output_scale
+        self.output_video_codec = output_video_codec
+        self.output_disable_audio = output_disable_audio
+        self.output_thread_queue_size = output_thread_queue_size
+        self.segment_duration = segment_duration
+
+        self.hwaccel = hwaccel
+        self.stats_period = stats_period
+
+        self.verbosity = verbosity
+
+    @property
+    def input_probe_data(self):
+        if not hasattr(self, '_input_probe_data'):
+            self._input_probe_data = {
+                f"input_{key}": value
+                for key, value in probe.extract_data(probe.probe(self.input)).items()
+            }
+        return self._input_probe_data
+
+    def make_shaper(self):
+        return Shaper(
+            bandwidth=utils.parse_bitrate(self.bandwidth) if self.bandwidth else None,
+            latency=self.latency / 1000,
+        )
+
+    def remux_ts(self, workdir):
+        filename = os.path.join(workdir, 'input.ts')
+        stream = ffmpeg.input(self.input).output(filename, format='mpegts', c='copy')
+        cmd_logger.debug(stream)
+        stream.run(quiet=True, overwrite_output=True)
+        return filename
+
+    def get_output(self, sink):
+        """Output URL and muxer options of the output transport."""
+        if self.output_transport == 'null':
+            return '/dev/null', {}
+        output_kwargs: dict[str, Any] = {
+            'method': 'PUT',
+            # Segments can only be cut on keyframes
+            'force_key_frames': f"expr:gte(t,n_forced*{self.segment_duration})",
+        }
+        if self.output_transport == 'hls':
+            output_kwargs.update({
+                'format': 'hls',
+                'hls_time': self.segment_duration,
+                'hls_list_size': 0,
+            })
+            return f"{sink.url}/live/index.m3u8", output_kwargs
+        output_kwargs.update({
+            'format': 'dash',
+            'seg_duration': self.segment_duration,
+        })
+        return f"{sink.url}/live/manifest.mpd", output_kwargs
+
+    def run_ffmpeg(self, output_stream):
+        stream = output_stream.global_args(
+            '-stats_period', str(self.stats_period),
+            '-progress', 'pipe:1',
+            '-nostats',
+        )
+        cmd = ffmpeg.compile(stream, overwrite_output=True)
+        cmd_logger.debug(' '.join(cmd))
+        return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def run(self):
+        shaper = self.make_shaper()
+        sink = server = sender = proc = None
+        with TemporaryDirectory() as workdir:
+            try:
+                if self.output_transport != 'null':
+                    sink = SegmentSink(shaper).start()
+                output, output_kwargs = self.get_output(sink)
+                input_kwargs = {}
+                if self.input_transport == 'http':
+                    server = FileServer(self.input, self.make_shaper()).start()
+                    input_url = f"{server.url}/{os.path.basename(self.input)}"
+                elif self.input_transport == 'udp':
+                    ts_file = self.remux_ts(workdir)
+                    port = get_free_port(socket.SOCK_DGRAM)
+                    options = ['overrun_nonfatal=1', f'timeout={UDP_TIMEOUT}']
+                    if self.udp_buffer_size is not None:
+                        options.append(f'buffer_size={self.udp_buffer_size}')
+                    if self.udp_fifo_size is not None:
+                        options.append(f'fifo_size={self.udp_fifo_size}')
+                    input_url = f"udp://{HOST}:{port}?{'&'.join(options)}"
+                    input_kwargs['format'] = 'mpegts'
+                    duration = float(self.input_probe_data['input_duration'])
+                    rate = shaper.bandwidth or os.path.getsize(ts_file) * 8 / duration
+                    sender = UdpSender(ts_file, port, rate)
+                else:
+                    input_url = self.input
+
+                transcoder = transcode.Transcoder(
+                    input=input_url,
+                    threads=self.threads,
+                    input_disable_audio=self.input_disable_audio,
+                    input_thread_queue_size=self.input_thread_queue_size,
+                    preset=self.preset,
+                    crf=self.crf,
+                    tune=self.tune,
+                    output=output,
+                    output_scale=self.output_scale,
+                    output_video_codec=self.output_video_codec,
+                    output_disable_audio=self.output_disable_audio,
+                    output_thread_queue_size=self.output_thread_queue_size,
+                    hwaccel=self.hwaccel,
+                    cgroup_enabled=False,
+                    verbosity=self.verbosity,
+                )
+                output_stream = transcoder.make_output_stream(input_kwargs, output_kwargs)
+
+                logger.info("Started streaming %s to %s", input_url, output)
+                frames = []
+                tail = deque(maxlen=TAIL_SIZE)
+                overruns = 0
+                ffmpeg_version = None
+                t0 = time.perf_counter()
+                proc = self.run_ffmpeg(output_stream)
+                assert proc.stdout is not None and proc.stderr is not None
+                reader = threading.Thread(target=breakdown.read_progress, args=(proc.stdout, frames))
+                reader.start()
+                if sender is not None:
+                    time.sleep(UDP_STARTUP)
+                    t0 = time.perf_counter()
+                    sender.start()
+                for line in proc.stderr:
+                    line = line.decode(errors='replace')
+                    if ffmpeg_version is None:
+                        ffmpeg_version = utils.parse_version(line) or ''
+                    if RE_OVERRUN.search(line):
+                        overruns += 1
+                    tail.append(line.rstrip())
+                returncode = proc.wait()
+                elapsed = time.perf_counter() - t0
+                reader.join()
+                if sender is not None:
+                    sender.join()
+            finally:
+                if proc is not None and proc.poll() is None:
+                    proc.kill()
+                if sender is not None:
+                    sender.stop()
+                if server is not None:
+                    server.stop()
+                if sink is not None:
+                    sink.stop()
+        nb_frames = frames[-1][1] if frames else 0
+        # A UDP input only ends on timeout, which ffmpeg may report as an error
+        if returncode and not (sender is not None and nb_frames):
+            raise ValueError(f"ffmpeg exited with code {returncode}: " + '\n'.join(tail))
+        if sender is not None and nb_frames:
+            # Leave out the UDP_TIMEOUT ffmpeg waits for after the last packet
+            elapsed = get_last_frame_time(frames) - t0
+        duration = float(self.input_probe_data['input_duration'])
+        results = {
+            'ffmpeg_version': ffmpeg_version,
+            'threads': self.threads,
+            'hwaccel': self.hwaccel,
+
+            'preset': self.preset,
+            'crf': self.crf,
+            'tune': self.tune,
+
+            'input': self.input,
+            **self.input_probe_data,
+            'input_transport': self.input_transport,
+            'input_thread_queue_size': self.input_thread_queue_size,
+            'bandwidth': self.bandwidth,
+            'latency': self.latency,
+
+            'output_transport': self.output_transport,
+            'output_scale': self.output_scale,
+            'output_video_codec': self.output_video_codec,
+            'output_thread_queue_size': self.output_thread_queue_size,
+            'segment_duration': self.segment_duration,
+
+            'nb_frames': nb_frames,
+            'elapsed': elapsed,
+            'fps': nb_frames / elapsed,
+            'realtime_factor': duration / elapsed,
+            **get_stalls(frames, self.stats_period),
+        }
+        if server is not None:
+            results.update(server.get_results(elapsed))
+        if sender is not None:
+            results.update(sender.get_results())
+            results['udp_overruns'] = overruns
+            results['frame_loss_percent'] = (
+                1 - nb_frames / self.input_probe_data['input_video_nb_frames']
+            ) * 100
+        if sink is not None:
+            results.update(sink.get_results(elapsed))
+        return results
+
+
+def streaming(**kwargs):
+    bench = StreamingBench(**kwargs)
+    results = bench.run()
+    return results
+
+
+def sweep_thread_queue_sizes(thread_queue_sizes, **kwargs):
+    """Run for each input thread queue size, keys are prefixed by size."""
+    results = {'input_thread_queue_sizes': thread_queue_sizes}
+    for size in thread_queue_sizes:
+        logger.info("Running with input thread queue size %s", size)
+        size_results = streaming(input_thread_queue_size=size, **kwargs)
+        for key, value in size_results.items():
+            if key == 'input_thread_queue_size':
+                continue
+            if key.startswith(('input_', 'output_', 'host_')) or key == 'ffmpeg_version':
+                results.setdefault(key, value)
+            else:
+                results[f"tqs_{size}_{key}"] = value
+    return results
+
+
+def main(args):
+    host_info = sysinfo.get_sysinfo()
+    sysinfo.validate_transcode(host_info, vars(args))
+    streaming_kwargs = dict(
+        input=args.input,
+        threads=args.threads,
+
+        input_transport=args.input_transport,
+        input_disable_audio=args.input_disable_audio,
+
+        bandwidth=args.bandwidth,
+        latency=args.latency,
+        udp_buffer_size=args.udp_buffer_size,
+        udp_fifo_size=args.udp_fifo_size,
+
+        preset=args.preset,
+        crf=args.crf,
+        tune=args.tune,
+
+        output_transport=args.output_transport,
+        output_scale=args.output_scale,
+        output_video_codec=args.output_video_codec,
+        output_disable_audio=args.output_disable_audio,
+        output_thread_queue_size=args.output_thread_queue_size,
+        segment_duration=args.segment_duration,
+
+        hwaccel=args.hwaccel,
+        stats_period=args.stats_period,
+
+        verbosity=args.verbosity,
+    )
+    thread_queue_sizes = args.input_thread_queue_size or [None]
+    if len(thread_queue_sizes) > 1:
+        results = sweep_thread_queue_sizes(thread_queue_sizes, **streaming_kwargs)
+    else:
+        results = streaming(input_thread_queue_size=thread_queue_sizes[0], **streaming_kwargs)
+    results.update(sysinfo.summarize(host_info))
+    return results
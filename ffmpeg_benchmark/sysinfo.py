@@ -0,0 +1,303 @@
+import os
+import re
+import glob
+import json
+import time
+import shutil
+import socket
+import logging
+import platform
+import subprocess
+from pathlib import Path
+
+logger = logging.getLogger('ffmpeg_benchmark')
+
+CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'ffmpeg-benchmark'
+ISA_FLAGS = (
+    'sse4_2',
+    'avx',
+    'avx2',
+    'fma',
+    'avx512f',
+    'avx512bw',
+    'avx512vl',
+    'avx512_vnni',
+    'neon',
+    'asimd',
+    'sve',
+)
+MEM_BANDWIDTH_SIZE = 64 * 1024 * 1024
+RE_CODEC_LINE = re.compile(r'^ ([A-Z.]{6}) (\S+)')
+RE_FILTER_LINE = re.compile(r'^ ([A-Z.]{2,3}) (\S+)')
+
+
+def make_parser(subparsers):
+    parser = subparsers.add_parser("sysinfo", help="Get info about the host and ffmpeg build")
+
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached data")
+    parser.add_argument("--full", action="store_true", help="Include lists of encoders, decoders and filters")
+
+
+def read_file(path, default=None):
+    try:
+        with open(path) as fd:
+            return fd.read().strip()
+    except OSError:
+        return default
+
+
+def parse_size(value):
+    """Convert sysfs sizes like ``32K`` to bytes."""
+    units = {'K': 1024, 'M': 1024**2, 'G': 1024**3}
+    if value and value[-1] in units:
+        return int(value[:-1]) * units[value[-1]]
+    return int(value) if value else None
+
+
+def get_cpu_info():
+    info = {
+        'cpu_model': platform.processor() or None,
+        'cpu_flags': [],
+    }
+    cpuinfo = {}
+    for line in read_file('/proc/cpuinfo', '').splitlines():
+        key, _, value = line.partition(':')
+        cpuinfo.setdefault(key.strip(), value.strip())
+    if cpuinfo.get('model name') or cpuinfo.get('Model'):
+        info['cpu_model'] = cpuinfo.get('model name') or cpuinfo.get('Model')
+    info['cpu_flags'] = (cpuinfo.get('flags') or cpuinfo.get('Features') or '').split()
+    if platform.system() == 'Darwin':
+        try:
+            info['cpu_model'] = subprocess.check_output(
+                ['sysctl', '-n', 'machdep.cpu.brand_string'], text=True,
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            pass
+    info['cpu_isa'] = [flag for flag in ISA_FLAGS if flag in info['cpu_flags']]
+    return info
+
+
+def get_cpu_topology():
+    cores = set()
+    packages = set()
+    threads = 0
+    for cpu in glob.glob('/sys/devices/system/cpu/cpu[0-9]*/topology'):
+        package = read_file(f'{cpu}/physical_package_id')
+        core = read_file(f'{cpu}/core_id')
+        packages.add(package)
+        cores.add((package, core))
+        threads += 1
+    threads = threads or os.cpu_count() or 1
+    nb_cores = len(cores) or threads
+    return {
+        'cpu_sockets': len(packages) or None,
+        'cpu_cores': nb_cores,
+        'cpu_threads': threads,
+        'cpu_smt': threads > nb_cores,
+    }
+
+
+def get_cpu_caches():
+    caches = {}
+    for index in sorted(glob.glob('/sys/devices/system/cpu/cpu0/cache/index*')):
+        level = read_file(f'{index}/level')
+        cache_type = read_file(f'{index}/type', '')
+        size = parse_size(read_file(f'{index}/size'))
+        suffix = {'Data': 'd', 'Instruction': 'i'}.get(cache_type, '')
+        caches[f'cache_l{level}{suffix}'] = size
+    return caches
+
+
+def get_memory_info():
+    meminfo = read_file('/proc/meminfo', '')
+    for line in meminfo.splitlines():
+        if line.startswith('MemTotal:'):
+            return {'mem_total': int(line.split()[1]) * 1024}
+    return {'mem_total': None}
+
+
+def measure_memory_bandwidth(size=MEM_BANDWIDTH_SIZE, repeat=3):
+    """Rough copy bandwidth in bytes per second, best of ``repeat`` copies."""
+    src = bytearray(size)
+    dst = bytearray(size)
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        dst[:] = src
+        best = min(best, time.perf_counter() - t0)
+    return size / best
+
+
+def get_system_info():
+    uname = platform.uname()
+    return {
+        'hostname': socket.gethostname(),
+        'system': uname.system,
+        'kernel': uname.release,
+        'machine': uname.machine,
+        'governor': read_file('/sys/devices/system/cpu/cpu0/cpufreq/scaling_governor'),
+        'python_version': platform.python_version(),
+    }
+
+
+def get_ffmpeg_binary():
+    path = shutil.which('ffmpeg')
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    return {
+        'path': path,
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+    }
+
+
+def run_ffmpeg(*args):
+    return subprocess.run(
+        ['ffmpeg', '-hide_banner', *args],
+        capture_output=True, text=True,
+    ).stdout
+
+
+def parse_codecs(output):
+    names = []
+    for line in output.splitlines():
+        search = RE_CODEC_LINE.match(line)
+        if search and search.group(2) != '=':
+            names.append(search.group(2))
+    return names
+
+
+def parse_filters(output):
+    names = []
+    for line in output.splitlines():
+        search = RE_FILTER_LINE.match(line)
+        if search and search.group(2) != '=':
+            names.append(search.group(2))
+    return names
+
+
+def get_ffmpeg_info():
+    version_output = run_ffmpeg('-version')
+    configuration = ''
+    for line in version_output.splitlines():
+        if line.startswith('configuration:'):
+            configuration = line.split(':', 1)[1].strip()
+    hwaccels = [
+        line.strip() for line in run_ffmpeg('-hwaccels').splitlines()[1:]
+        if line.strip()
+    ]
+    filters = parse_filters(run_ffmpeg('-filters'))
+    return {
+        'ffmpeg_configuration': configuration,
+        'ffmpeg_encoders': parse_codecs(run_ffmpeg('-encoders')),
+        'ffmpeg_decoders': parse_codecs(run_ffmpeg('-decoders')),
+        'ffmpeg_hwaccels': hwaccels,
+        'ffmpeg_filters': filters,
+        'ffmpeg_has_libvmaf': 'libvmaf' in filters,
+    }
+
+
+def collect():
+    info = {
+        **get_system_info(),
+        **get_cpu_info(),
+        **get_cpu_topology(),
+        **get_cpu_caches(),
+        **get_memory_info(),
+        'mem_bandwidth': measure_memory_bandwidth(),
+    }
+    binary = get_ffmpeg_binary()
+    info['ffmpeg_binary'] = binary
+    if binary is not None:
+        info.update(get_ffmpeg_info())
+    return info
+
+
+def get_sysinfo(refresh=False):
+    """
+    Return host and ffmpeg info, cached per host until the ffmpeg binary
+    changes.
+    """
+    cache_file = CACHE_DIR / f'sysinfo-{socket.gethostname()}.json'
+    binary = get_ffmpeg_binary()
+    if not refresh and cache_file.exists():
+        try:
+            with cache_file.open() as fd:
+                cached = json.load(fd)
+        except (OSError, ValueError):
+            cached = None
+        if cached and cached.get('ffmpeg_binary') == binary:
+            logger.debug("Using cached system info from %s", cache_file)
+            return cached
+    logger.info("Collecting system info")
+    info = collect()
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with cache_file.open('w') as fd:
+            json.dump(info, fd)
+    except OSError as err:
+        logger.warning("Cannot cache system info: %s", err)
+    return info
+
+
+def summarize(info):
+    """Keep the scalar fields, to be attached to benchmark results."""
+    skipped = ('cpu_flags', 'ffmpeg_encoders', 'ffmpeg_decoders', 'ffmpeg_filters', 'ffmpeg_binary')
+    summary = {}
+    for key, value in info.items():
+        if key in skipped:
+            continue
+        if isinstance(value, list):
+            value = ','.join(value)
+        summary[f'host_{key}'] = value
+    return summary
+
+
+def validate(info, encoders=(), filters=(), hwaccels=()):
+    """Raise ValueError if the ffmpeg build lacks a requested feature."""
+    if info.get('ffmpeg_binary') is None:
+        logger.warning("ffmpeg not found, cannot validate its capabilities")
+        return
+    missing = []
+    for kind, names, available in (
+        ('encoder', encoders, info['ffmpeg_encoders']),
+        ('filter', filters, info['ffmpeg_filters']),
+        ('hwaccel', hwaccels, info['ffmpeg_hwaccels']),
+    ):
+        missing += [f"{kind} {name}" for name in names if name and name not in available]
+    if missing:
+        raise ValueError("ffmpeg does not support: " + ', '.join(missing))
+
+
+def validate_transcode(info, kwargs, enable_psnr=False, enable_vmaf=False):
+    """Check the features a Transcoder with ``kwargs`` needs."""
+    filters = []
+    if kwargs.get('output_scale'):
+        filters.append('scale')
+    if enable_psnr:
+        filters.append('psnr')
+    if enable_vmaf:
+        filters.append('libvmaf')
+    if kwargs.get('output_audio_sample_rate') or kwargs.get('audio_resampler'):
+        filters.append('aresample')
+    if kwargs.get('output_audio_channel_layout'):
+        filters.append('aformat')
+    hwaccel = kwargs.get('hwaccel', 'none')
+    validate(
+        info,
+        encoders=[
+            codec for codec in (kwargs.get('output_video_codec'), kwargs.get('output_audio_codec'))
+            if codec != 'copy'
+        ],
+        filters=filters,
+        hwaccels=[hwaccel] if hwaccel not in ('none', 'auto') else [],
+    )
+
+
+def main(args):
+    info = get_sysinfo(refresh=args.refresh)
+    if args.full:
+        return info
+    return summarize(info)
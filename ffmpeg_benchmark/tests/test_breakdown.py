@@ -0,0 +1,21 @@
+from unittest import TestCase
+
+from ffmpeg_benchmark import breakdown
+
+
+class StageTimesTest(TestCase):
+    def test_feed(self):
+        stage_times = breakdown.StageTimes()
+        for line in (
+            'ffmpeg version 6.1.1 Copyright (c) 2000-2023 the FFmpeg developers\n',
+            'bench: 1000 user 100 sys 2000 real decode_video_0.0\n',
+            'bench: 3000 user 0 sys 4000 real encode_video_0.0\n',
+            'bench: 500 user 0 sys 500 real flush_video_0.0\n',
+            'bench: 10 user 0 sys 10 real unknown_event\n',
+            'bench: utime=0.010s stime=0.001s rtime=0.010s\n',
+        ):
+            stage_times.feed(line)
+        self.assertEqual(stage_times.times['decode']['real'], 2000)
+        self.assertEqual(stage_times.times['encode']['real'], 4500)
+        self.assertEqual(stage_times.times['encode']['calls'], 2)
+        self.assertEqual(stage_times.get_residual()['real'], 3500)
@@ -0,0 +1,37 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from ffmpeg_benchmark import cgroup
+
+
+class CgroupTest(TestCase):
+    def setUp(self):
+        tmpdir = TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.parent = Path(tmpdir.name)
+
+    def test_create(self):
+        job_cgroup = cgroup.Cgroup('job', parent=self.parent).create()
+        self.assertTrue(job_cgroup.path.is_dir())
+        job_cgroup.remove()
+        self.assertFalse(job_cgroup.path.exists())
+
+    def test_create_stale(self):
+        (self.parent / 'job').mkdir()
+        with self.assertLogs('ffmpeg_benchmark', 'WARNING'):
+            job_cgroup = cgroup.Cgroup('job', parent=self.parent).create()
+        self.assertTrue(job_cgroup.path.is_dir())
+
+    def test_create_busy(self):
+        # Like a cgroup still holding processes, which cannot be removed
+        (self.parent / 'job').mkdir()
+        (self.parent / 'job' / 'cgroup.procs').write_text('1')
+        with self.assertRaises(OSError), self.assertLogs('ffmpeg_benchmark', 'WARNING'):
+            cgroup.Cgroup('job', parent=self.parent).create()
+
+
+class ParseTest(TestCase):
+    def test_parse_memory(self):
+        self.assertEqual(cgroup.parse_memory('512M'), 512 * 1024**2)
+        self.assertEqual(cgroup.parse_memory('1024'), 1024)
@@ -0,0 +1,49 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from ffmpeg_benchmark import corpus
+
+
+class CorpusTest(TestCase):
+    def setUp(self):
+        tmpdir = TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.dir = tmpdir.name
+        for name in ('a.mp4', 'b.mkv', 'Movie [1080p].mp4', 'notes.md'):
+            open(os.path.join(self.dir, name), 'w').close()
+        self.manifest = os.path.join(self.dir, 'list.txt')
+        with open(self.manifest, 'w') as fd:
+            fd.write('# titles\na.mp4\n{"input": "b.mkv", "category": "film"}\n')
+
+    def test_is_corpus(self):
+        self.assertTrue(corpus.is_corpus(self.dir))
+        self.assertTrue(corpus.is_corpus(os.path.join(self.dir, '*.mp4')))
+        self.assertTrue(corpus.is_corpus(self.manifest))
+        self.assertFalse(corpus.is_corpus(os.path.join(self.dir, 'a.mp4')))
+        self.assertFalse(corpus.is_corpus(os.path.join(self.dir, 'Movie [1080p].mp4')))
+        self.assertFalse(corpus.is_corpus('https://example.com/video.mp4?token=[abc]'))
+
+    def test_list_directory(self):
+        entries = corpus.list_inputs(self.dir)
+        self.assertEqual([e['name'] for e in entries], ['Movie [1080p]', 'a', 'b'])
+        self.assertEqual({e['category'] for e in entries}, {None})
+
+    def test_list_manifest(self):
+        entries = corpus.list_inputs(self.manifest)
+        self.assertEqual([e['input'] for e in entries], [
+            os.path.join(self.dir, 'a.mp4'),
+            os.path.join(self.dir, 'b.mkv'),
+        ])
+        self.assertEqual([e['category'] for e in entries], [None, 'film'])
+
+    def test_empty(self):
+        with self.assertRaises(ValueError):
+            corpus.list_inputs(os.path.join(self.dir, '*.webm'))
+
+    def test_weight(self):
+        entry = {'probe': {'duration': 10.0, 'video_nb_frames': None}}
+        self.assertEqual(corpus.get_weight(entry, 'frames'), 10.0)
+        entry = {'probe': {'duration': 10.0, 'video_nb_frames': 250}}
+        self.assertEqual(corpus.get_weight(entry, 'frames'), 250)
+        self.assertEqual(corpus.get_weight(entry, 'duration'), 10.0)
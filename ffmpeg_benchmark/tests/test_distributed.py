@@ -0,0 +1,103 @@
+import time
+import threading
+from unittest import TestCase, mock
+
+from ffmpeg_benchmark import distributed
+
+
+class CoordinatorTest(TestCase):
+    def lease(self, coordinator, worker_id='worker-0', host='host-0'):
+        job, finished = coordinator.lease(worker_id, host)
+        self.assertFalse(finished)
+        assert job is not None
+        return job
+
+    def test_lease_expiry(self):
+        coordinator = distributed.Coordinator([{}], lease_timeout=0, max_attempts=2)
+        job = self.lease(coordinator)
+        self.assertEqual(job['attempt'], 1)
+        # No heartbeat: the job is given back to the queue
+        coordinator.expire()
+        self.assertEqual(coordinator.status()['pending'], 1)
+        job = self.lease(coordinator, 'worker-1', 'host-1')
+        self.assertEqual(job['attempt'], 2)
+        coordinator.expire()
+        # Results of expired leases are refused
+        self.assertFalse(coordinator.complete(job['lease_id'], True, {}, None))
+        self.assertEqual(coordinator.status()['failed'], 1)
+        self.assertTrue(coordinator.done.is_set())
+
+    def test_heartbeat(self):
+        coordinator = distributed.Coordinator([{}], lease_timeout=1)
+        job = self.lease(coordinator)
+        time.sleep(0.6)
+        self.assertTrue(coordinator.heartbeat(job['lease_id']))
+        time.sleep(0.6)
+        coordinator.expire()
+        self.assertEqual(coordinator.status()['running'], 1)
+        self.assertTrue(coordinator.complete(job['lease_id'], True, {}, None))
+        self.assertEqual(coordinator.status()['done'], 1)
+
+    def test_retry(self):
+        coordinator = distributed.Coordinator([{}], max_attempts=2)
+        job = self.lease(coordinator)
+        self.assertTrue(coordinator.complete(job['lease_id'], False, None, None, error='err'))
+        self.assertEqual(coordinator.status()['pending'], 1)
+        job = self.lease(coordinator)
+        self.assertEqual(job['attempt'], 2)
+        self.assertTrue(coordinator.complete(job['lease_id'], True, {}, None))
+        status = coordinator.status()
+        self.assertEqual(status['done'], 1)
+        self.assertEqual(status['attempts'], 2)
+        self.assertEqual([r['ok'] for r in coordinator.results], [False, True])
+
+    def test_max_attempts(self):
+        coordinator = distributed.Coordinator([{}], max_attempts=1)
+        job = self.lease(coordinator)
+        coordinator.complete(job['lease_id'], False, None, None)
+        self.assertEqual(coordinator.status()['failed'], 1)
+        self.assertEqual(coordinator.lease('worker-0', 'host-0'), (None, True))
+
+    def test_host_limits(self):
+        coordinator = distributed.Coordinator([{}] * 4, host_limits={'big': 2})
+        first = self.lease(coordinator, 'worker-0', 'small')
+        self.assertEqual(coordinator.lease('worker-1', 'small'), (None, False))
+        self.lease(coordinator, 'worker-2', 'big')
+        self.lease(coordinator, 'worker-3', 'big')
+        self.assertEqual(coordinator.lease('worker-4', 'big'), (None, False))
+        coordinator.complete(first['lease_id'], True, {}, None)
+        self.lease(coordinator, 'worker-1', 'small')
+
+
+class CoordinateTest(TestCase):
+    def setUp(self):
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+        patches = [
+            mock.patch.object(distributed, 'POLL_INTERVAL', 0.05),
+            mock.patch.object(distributed.sysinfo, 'get_sysinfo', return_value={}),
+            mock.patch.object(distributed.sysinfo, 'summarize', return_value={}),
+            mock.patch.object(distributed.sysinfo, 'validate_transcode'),
+            mock.patch.object(distributed.transcode, 'transcode', side_effect=self.transcode),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def transcode(self, **kwargs):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.2)
+        with self.lock:
+            self.running -= 1
+        return {'input': kwargs['input'], 'error_count': 0}
+
+    def test_local_workers(self):
+        jobs = [{'input': f'input-{i}.mp4'} for i in range(6)]
+        results = distributed.coordinate(jobs, host='127.0.0.1', port=0, local_workers=3)
+        self.assertEqual(results['done'], 6)
+        self.assertEqual(results['failed'], 0)
+        # Local workers are not serialized by the default host limit
+        self.assertEqual(self.max_running, 3)
@@ -0,0 +1,60 @@
+from unittest import TestCase
+
+from ffmpeg_benchmark import estimate
+
+
+def make_window(start, complexity, scenes, nb_frames=125):
+    return {'start': start, 'complexity': complexity, 'scenes': scenes, 'nb_frames': nb_frames}
+
+
+class SelectSnippetsTest(TestCase):
+    def test_scene_density(self):
+        windows = [
+            make_window(0, 100, 0),
+            make_window(5, 110, 4),
+            make_window(10, 120, 1),
+            make_window(15, 1000, 2),
+            make_window(20, 1100, 0),
+            make_window(25, 1200, 9),
+        ]
+        snippets = estimate.select_snippets(windows, 2, per_stratum=1)
+        # Each complexity stratum gives its window of median scene changes
+        self.assertEqual([s['start'] for s in snippets], [10, 15])
+        self.assertEqual([s['weight'] for s in snippets], [375, 375])
+
+    def test_two_per_stratum(self):
+        windows = [make_window(i * 5, 100 * (i // 4 + 1), i % 4) for i in range(8)]
+        snippets = estimate.select_snippets(windows, 4)
+        self.assertEqual([s['stratum'] for s in snippets], [0, 0, 1, 1])
+        # Picks are spread over the scene change density of the stratum
+        self.assertEqual([s['scenes'] for s in snippets], [1, 3, 1, 3])
+        self.assertEqual(sum(s['weight'] for s in snippets), 1000)
+
+    def test_fewer_windows(self):
+        snippets = estimate.select_snippets([make_window(0, 100, 0)], 8)
+        self.assertEqual(len(snippets), 1)
+
+
+class StratifiedEstimateTest(TestCase):
+    def test_estimate(self):
+        snippets = [
+            {'stratum': 0, 'weight': 150},
+            {'stratum': 0, 'weight': 150},
+            {'stratum': 1, 'weight': 350},
+            {'stratum': 1, 'weight': 350},
+        ]
+        mean, bound = estimate.stratified_estimate([1, 3, 10, 10], snippets)
+        self.assertAlmostEqual(mean, 0.3 * 2 + 0.7 * 10)
+        # Only the first stratum varies: 1.96 * sqrt(0.3**2 * 2 / 2)
+        assert bound is not None
+        self.assertAlmostEqual(bound, estimate.Z_95 * 0.3)
+
+    def test_homogeneous_strata(self):
+        # Strata differing from each other are not sampling error
+        snippets = [{'stratum': i // 2, 'weight': 1} for i in range(4)]
+        _, bound = estimate.stratified_estimate([1, 1, 100, 100], snippets)
+        self.assertEqual(bound, 0)
+
+    def test_single_snippets(self):
+        snippets = [{'stratum': 0, 'weight': 1}, {'stratum': 1, 'weight': 1}]
+        self.assertEqual(estimate.stratified_estimate([1, 3], snippets), (2, None))
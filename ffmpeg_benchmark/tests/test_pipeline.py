@@ -0,0 +1,48 @@
+import sys
+import threading
+from unittest import TestCase, mock
+
+from ffmpeg_benchmark import pipeline
+
+# Writes raw frames until the pipe is closed
+DECODER = [sys.executable, '-c', 'import sys\nwhile True: sys.stdout.buffer.write(bytes(65536))']
+FAILING_ENCODER = [sys.executable, '-c', 'import sys; sys.exit(1)']
+
+
+class RunPipelineTest(TestCase):
+    def run_pipeline(self, mode):
+        runner = pipeline.Pipeline(input='input.mp4', mode=mode, raw_pix_fmt='yuv420p')
+        patches = [
+            mock.patch.object(runner, 'make_decoder', return_value='decoder'),
+            mock.patch.object(runner, 'make_encoder', return_value='encoder'),
+            mock.patch.object(
+                pipeline.ffmpeg, 'compile',
+                side_effect=lambda stream, **kwargs: DECODER if stream == 'decoder' else FAILING_ENCODER,
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        results = {}
+        thread = threading.Thread(target=lambda: results.update(runner.run_pipeline()), daemon=True)
+        thread.start()
+        thread.join(timeout=30)
+        self.assertFalse(thread.is_alive(), f"{mode} pipeline is stuck after an encoder failure")
+        return results
+
+    def test_failing_encoder_direct(self):
+        self.assertFalse(self.run_pipeline('direct')['ok'])
+
+    def test_failing_encoder_copy(self):
+        self.assertFalse(self.run_pipeline('copy')['ok'])
+
+
+class BaselineTest(TestCase):
+    def test_threads(self):
+        runner = pipeline.Pipeline(input='input.mp4', threads=4)
+        with mock.patch.object(pipeline.transcode, 'Transcoder') as transcoder:
+            runner.run_baseline()
+        kwargs = transcoder.call_args.kwargs
+        # The encoder of both sides uses the same threads
+        self.assertEqual(kwargs['threads'], 4)
+        self.assertEqual(kwargs['output_threads'], 4)
@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+from ffmpeg_benchmark import probe
+
+
+def make_probe(**video):
+    return {
+        'format': {
+            'bit_rate': '2000000',
+            'duration': '10.000000',
+            'format_name': 'matroska,webm',
+            'nb_programs': 0,
+            'nb_streams': 2,
+            'probe_score': 100,
+            'size': '2500000',
+        },
+        'streams': [
+            {
+                'codec_type': 'video',
+                'codec_name': 'h264',
+                'height': 720,
+                'width': 1280,
+                'pix_fmt': 'yuv420p',
+                'r_frame_rate': '25/1',
+                **video,
+            },
+            {
+                'codec_type': 'audio',
+                'codec_name': 'opus',
+                'sample_rate': '48000',
+                'channels': 2,
+            },
+        ],
+    }
+
+
+class ExtractDataTest(TestCase):
+    def test_mp4(self):
+        data = probe.extract_data(make_probe(bit_rate='1800000', nb_frames='250'))
+        self.assertEqual(data['video_bit_rate'], '1800000')
+        self.assertEqual(data['video_nb_frames'], 250)
+        self.assertEqual(data['video_frame_rate'], 25)
+
+    def test_matroska(self):
+        data = probe.extract_data(make_probe())
+        self.assertIsNone(data['video_bit_rate'])
+        self.assertIsNone(data['video_nb_frames'])
+        self.assertIsNone(data['audio_nb_frames'])
+        self.assertEqual(data['audio_duration'], 10)
@@ -0,0 +1,62 @@
+import os
+import urllib.request
+from tempfile import TemporaryDirectory
+from unittest import TestCase, mock
+
+from ffmpeg_benchmark import streaming
+
+
+class GetStallsTest(TestCase):
+    def test_stall(self):
+        frames = [(0, 0), (1, 0), (2, 10), (3, 10), (4, 10), (5, 20)]
+        stalls = streaming.get_stalls(frames, 1)
+        self.assertEqual(stalls['stalls'], 1)
+        self.assertEqual(stalls['stall_time'], 2)
+
+    def test_end_of_input(self):
+        frames = [(0, 10), (1, 20), (2, 20), (3, 20)]
+        stalls = streaming.get_stalls(frames, 1)
+        self.assertEqual(stalls['stalls'], 0)
+        self.assertEqual(stalls['stall_time'], 0)
+
+    def test_last_frame_time(self):
+        frames = [(0, 10), (1, 20), (2, 20), (3, 20)]
+        self.assertEqual(streaming.get_last_frame_time(frames), 1)
+
+
+class FileServerTest(TestCase):
+    def setUp(self):
+        tmpdir = TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'input.ts')
+        with open(self.filename, 'wb') as fd:
+            fd.write(bytes(range(256)) * 4)
+        self.server = streaming.FileServer(self.filename, streaming.Shaper()).start()
+        self.addCleanup(self.server.stop)
+
+    def test_get(self):
+        with urllib.request.urlopen(f"{self.server.url}/input.ts") as response:
+            self.assertEqual(len(response.read()), 1024)
+        self.server.stop()
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(self.server.bytes_sent, 1024)
+
+    def test_range(self):
+        request = urllib.request.Request(f"{self.server.url}/input.ts", headers={'Range': 'bytes=256-511'})
+        with urllib.request.urlopen(request) as response:
+            self.assertEqual(response.status, 206)
+            self.assertEqual(response.read(), bytes(range(256)))
+
+
+class StreamingBenchTest(TestCase):
+    def test_stop_on_error(self):
+        bench = streaming.StreamingBench(input='input.mp4', input_transport='http', output_transport='hls')
+        with mock.patch.object(streaming.transcode, 'Transcoder'), \
+                mock.patch.object(bench, 'run_ffmpeg', side_effect=OSError("ffmpeg not found")), \
+                mock.patch.object(streaming.StandIn, 'stop', autospec=True) as stop:
+            with self.assertRaises(OSError):
+                bench.run()
+        stopped = [call.args[0] for call in stop.call_args_list]
+        self.assertEqual([type(s) for s in stopped], [streaming.FileServer, streaming.SegmentSink])
+        for stand_in in stopped:
+            stand_in.stop()
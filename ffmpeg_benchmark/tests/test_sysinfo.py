@@ -0,0 +1,30 @@
+from unittest import TestCase
+
+from ffmpeg_benchmark import sysinfo
+
+INFO = {
+    'ffmpeg_binary': '/usr/bin/ffmpeg',
+    'ffmpeg_encoders': ['libx264', 'aac'],
+    'ffmpeg_filters': ['scale'],
+    'ffmpeg_hwaccels': ['vaapi'],
+}
+
+
+class ValidateTranscodeTest(TestCase):
+    def test_supported(self):
+        sysinfo.validate_transcode(INFO, {
+            'output_video_codec': 'libx264',
+            'output_audio_codec': 'aac',
+            'output_scale': '1280:720',
+            'hwaccel': 'vaapi',
+        })
+
+    def test_copy(self):
+        sysinfo.validate_transcode(INFO, {'output_video_codec': 'copy', 'output_audio_codec': 'copy'})
+
+    def test_missing(self):
+        with self.assertRaisesRegex(ValueError, 'encoder libx265, filter aresample'):
+            sysinfo.validate_transcode(INFO, {'output_video_codec': 'libx265', 'audio_resampler': 'soxr'})
+
+    def test_no_ffmpeg(self):
+        sysinfo.validate_transcode({'ffmpeg_binary': None}, {'output_video_codec': 'libx265'})
@@ -0,0 +1,100 @@
+from unittest import TestCase, mock
+
+from ffmpeg_benchmark import transcode
+from ffmpeg_benchmark.tests.test_probe import make_probe
+
+
+class TranscoderTest(TestCase):
+    def test_cgroup_opt_in(self):
+        self.assertFalse(transcode.Transcoder(input='input.mp4').cgroup_enabled)
+        self.assertTrue(transcode.Transcoder(input='input.mp4', cgroup_enabled=True).cgroup_enabled)
+
+    def test_cgroup_limits(self):
+        transcoder = transcode.Transcoder(input='input.mp4', cgroup_cpus=2)
+        self.assertTrue(transcoder.cgroup_enabled)
+
+    def test_cgroup_data(self):
+        transcoder = transcode.Transcoder(input='input.mp4', cgroup_cpus=2, cgroup_memory='1G')
+        stats = {'nr_periods': 10, 'nr_throttled': 5, 'throttled_time': 0.5, 'memory_peak': 2**30}
+        run_results = [
+            {'ok': True, **stats, 'oom_kill': 0},
+            {'ok': False, **stats, 'oom_kill': 1},
+        ]
+        data = transcoder.get_cgroup_data(run_results, [30.0])
+        self.assertEqual(data['oom_kill_count'], 1)
+        self.assertEqual(data['throttled_times'], [0.5, 0.5])
+        self.assertEqual(data['fps_per_cpu'], 15)
+
+    def test_audio_transcoded(self):
+        transcoder = transcode.Transcoder(input='input.mp4')
+        transcoder._input_probe = make_probe()
+        self.assertTrue(transcoder.is_audio_transcoded)
+
+    def test_scaled_audio_dropped(self):
+        transcoder = transcode.Transcoder(input='input.mp4', output_scale='640:360')
+        transcoder._input_probe = make_probe()
+        self.assertFalse(transcoder.is_audio_transcoded)
+        transcoder.output_audio_codec = 'aac'
+        self.assertTrue(transcoder.is_audio_transcoded)
+
+
+class CgroupCleanupTest(TestCase):
+    def run_transcoder(self, job_cgroup, output_stream):
+        transcoder = transcode.Transcoder(input='input.mp4', cgroup_cpus=2)
+        with mock.patch.object(transcode.cgroup, 'enable_controllers'), \
+                mock.patch.object(transcode.cgroup, 'Cgroup') as cgroup_class, \
+                mock.patch.object(transcoder, 'make_output_stream', return_value=output_stream):
+            cgroup_class.return_value.create.return_value = job_cgroup
+            transcoder.run()
+
+    def test_set_limits_error(self):
+        job_cgroup = mock.Mock()
+        job_cgroup.set_limits.side_effect = PermissionError("cpu.max")
+        with self.assertRaises(PermissionError):
+            self.run_transcoder(job_cgroup, mock.Mock())
+        job_cgroup.remove.assert_called_once_with()
+
+    def test_run_async_error(self):
+        job_cgroup = mock.Mock()
+        output_stream = mock.Mock()
+        output_stream.run_async.side_effect = FileNotFoundError("ffmpeg")
+        with self.assertRaises(FileNotFoundError):
+            self.run_transcoder(job_cgroup, output_stream)
+        job_cgroup.remove.assert_called_once_with()
+
+
+class GetPodSizesTest(TestCase):
+    def test_default(self):
+        self.assertEqual(transcode.get_pod_sizes(), [(None, None)])
+
+    def test_pairs(self):
+        self.assertEqual(transcode.get_pod_sizes([1, 2], ['1G']), [(1, '1G'), (2, '1G')])
+        self.assertEqual(transcode.get_pod_sizes([1], ['1G', '2G']), [(1, '1G'), (1, '2G')])
+
+    def test_mismatch(self):
+        with self.assertRaises(ValueError):
+            transcode.get_pod_sizes([1, 2], ['1G', '2G', '3G'])
+
+
+class ProbeDataTest(TestCase):
+    def make_transcoder(self, input_probe, output_probe):
+        transcoder = transcode.Transcoder(input='input.mp4', output='output.mkv')
+        transcoder._input_probe = input_probe
+        transcoder._output_probe = output_probe
+        return transcoder
+
+    def test_matroska_output(self):
+        input_probe = make_probe(bit_rate='2000000', nb_frames='250')
+        transcoder = self.make_transcoder(input_probe, make_probe())
+        self.assertIsNone(transcoder.output_probe_data['output_video_nb_frames'])
+        self.assertEqual(transcoder.output_probe_data['output_size'], 2500000)
+        diff = transcoder.get_diff_data()
+        self.assertIsNone(diff['bitrate_diff'])
+        self.assertEqual(diff['size_diff'], 0)
+
+    def test_bitrate_diff(self):
+        input_probe = make_probe(bit_rate='2000000', nb_frames='250')
+        output_probe = make_probe(bit_rate='1000000', nb_frames='250')
+        diff = self.make_transcoder(input_probe, output_probe).get_diff_data()
+        self.assertEqual(diff['bitrate_diff'], -1000000)
+        self.assertEqual(diff['bitrate_grow'], -50)
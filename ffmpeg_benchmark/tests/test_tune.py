@@ -0,0 +1,113 @@
+import itertools
+from unittest import TestCase, mock
+
+from ffmpeg_benchmark import probe
+from ffmpeg_benchmark import transcode
+from ffmpeg_benchmark import tune
+from ffmpeg_benchmark.tests.test_probe import make_probe
+
+STDERR = b"""ffmpeg version 6.1.1 Copyright (c) 2000-2023 the FFmpeg developers
+bench: utime=1.000s stime=0.100s rtime=1.250s
+"""
+
+
+class BisectLastTest(TestCase):
+    def test_threshold(self):
+        for threshold, hint in itertools.product(range(10, 21), (None, 10, 13, 20, 25)):
+            self.assertEqual(tune.bisect_last(lambda x: x <= threshold, 10, 20, hint), threshold)
+
+    def test_none(self):
+        self.assertIsNone(tune.bisect_last(lambda x: x <= 5, 10, 20))
+        self.assertIsNone(tune.bisect_last(lambda x: x <= 5, 10, 20, hint=15))
+
+    def test_above(self):
+        self.assertEqual(tune.bisect_last(lambda x: x <= 30, 10, 20, hint=12), 20)
+
+    def test_hint_probes(self):
+        probed = []
+
+        def predicate(x):
+            probed.append(x)
+            return x <= 23
+        self.assertEqual(tune.bisect_last(predicate, 0, 51, hint=23), 23)
+        self.assertEqual(probed, [23, 24, 23])
+
+
+class ParetoFrontierTest(TestCase):
+    def test_dominates(self):
+        a = {'fps': 100, 'vmaf': 95, 'bitrate': 1e6}
+        self.assertTrue(tune.dominates(a, {'fps': 90, 'vmaf': 95, 'bitrate': 1e6}))
+        self.assertFalse(tune.dominates(a, a))
+        self.assertFalse(tune.dominates(a, {'fps': 90, 'vmaf': 96, 'bitrate': 1e6}))
+
+    def test_frontier(self):
+        points = [
+            {'fps': 50, 'vmaf': 96, 'bitrate': 2e6},
+            {'fps': 100, 'vmaf': 93, 'bitrate': 2e6},
+            {'fps': 90, 'vmaf': 92, 'bitrate': 2e6},
+            {'fps': 40, 'vmaf': 90, 'bitrate': 1e6},
+        ]
+        frontier = tune.pareto_frontier(points)
+        self.assertEqual([p['fps'] for p in frontier], [100, 50, 40])
+
+
+class SearchCrfTest(TestCase):
+    def make_tuner(self, **kwargs):
+        tuner = tune.Tuner(input='input.mp4', crf_min=15, crf_max=40, **kwargs)
+        evaluated = []
+
+        def evaluate(preset, crf, threads, snippets, workdir):
+            evaluated.append(crf)
+            return {'crf': crf, 'fps': crf, 'vmaf': 120 - crf, 'bitrate': 40e6 / crf}
+        tuner.evaluate = evaluate
+        return tuner, evaluated
+
+    def test_vmaf(self):
+        tuner, _ = self.make_tuner(target_vmaf=93)
+        best, points = tuner.search_crf('medium', None, [], None)
+        assert best is not None
+        self.assertEqual(best['crf'], 27)
+        self.assertIn(best, points)
+
+    def test_bitrate_only(self):
+        tuner, evaluated = self.make_tuner(target_vmaf=0, max_bitrate='2M')
+        best, _ = tuner.search_crf('medium', None, [], None, hint=25)
+        # Lowest CRF whose bitrate fits: 40M / 20
+        assert best is not None
+        self.assertEqual(best['crf'], 20)
+        self.assertTrue(all(crf > 0 for crf in evaluated))
+
+    def test_unfeasible(self):
+        tuner, _ = self.make_tuner(target_vmaf=0, max_bitrate='500K')
+        best, points = tuner.search_crf('medium', None, [], None)
+        self.assertIsNone(best)
+        self.assertTrue(points)
+
+
+class EncodeTest(TestCase):
+    def setUp(self):
+        process = mock.Mock(pid=0, returncode=0)
+        process.communicate.return_value = (b'', STDERR)
+        output_stream = mock.Mock()
+        output_stream.run_async.return_value = process
+
+        def fake_probe(input):
+            if input.endswith('.mkv'):
+                # Matroska streams have no bit rate nor frame count
+                return make_probe()
+            return make_probe(bit_rate='1800000', nb_frames='250')
+        patches = [
+            mock.patch.object(transcode.Transcoder, 'make_output_stream', return_value=output_stream),
+            mock.patch.object(probe, 'probe', side_effect=fake_probe),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_matroska_output(self):
+        tuner = tune.Tuner(input='input.mp4', target_vmaf=93)
+        output, measurement = tuner.encode('medium', 23, None, {'start': 0.0}, '/tmp')
+        self.assertTrue(output.endswith('.mkv'))
+        self.assertEqual(measurement['frames'], 100)
+        self.assertEqual(measurement['size'], 2500000)
+        self.assertEqual(tuner.encodes, 1)
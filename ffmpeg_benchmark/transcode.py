@@ -1,3 +1,4 @@
+import os
 import atexit
 import re
 from tempfile import TemporaryDirectory
@@ -5,6 +6,7 @@ import time
 import platform
 import logging
 from concurrent.futures import ThreadPoolExecutor
+from typing import Any
 
 import ffmpeg
 import handystats
@@ -13,6 +15,10 @@ from ffmpeg_benchmark import probe
 from ffmpeg_benchmark import psnr
 from ffmpeg_benchmark import vmaf
 from ffmpeg_benchmark import utils
+from ffmpeg_benchmark import sysinfo
+from ffmpeg_benchmark import cgroup
+from ffmpeg_benchmark import energy
+from ffmpeg_benchmark import corpus
 
 try:
     from probes import ProbeManager
@@ -47,10 +53,37 @@ PRESETS = (
     'slower',
     'veryslow',
 )
+# Per-run keys reported for each pod size of a cgroup sweep
+SWEEP_PREFIXES = (
+    'elapsed',
+    'fps',
+    'cpu_time',
+    'throttled',
+    'nr_throttled',
+    'memory_peak',
+    'oom_kill',
+    'error_count',
+    'cgroup_',
+)
+RESAMPLERS = (
+    'swr',
+    'soxr',
+)
+# Keys reported for each phase of a mixed audio and video run
+MIXED_KEYS = (
+    'error_count',
+    'elapsed_mean',
+    'fps_mean',
+    'audio_samples_per_sec_mean',
+    'audio_realtime_factor_mean',
+)
 TUNES = (
     'film',
     'animation',
     'grain',
+    'stillimage',
+    'fastdecode',
+    'zerolatency',
 )
 
 
@@ -61,23 +94,28 @@ def make_parser(subparsers):
     parser.add_argument("--threads", type=int, help="Number of threads to use.")
     parser.add_argument("--filter-threads", type=int, help="Number of threads are used to process a filter pipeline.")
 
-    parser.add_argument("--input", "-i", required=True)
+    parser.add_argument("--input", "-i", required=True, help="File, URL, directory, glob or manifest of inputs")
     parser.add_argument("--input-format", "-if", required=False)
     parser.add_argument("--input-video-codec", '-ic:v', required=False)
     parser.add_argument("--input-audio-codec", '-ic:a', required=False)
     parser.add_argument("--input-disable-audio", action='store_true')
+    parser.add_argument("--input-disable-video", action='store_true', help="Transcode audio only")
     parser.add_argument("--input-thread-queue-size", type=int, required=False, help="Max number of queued packets when reading from the file or device")
 
     parser.add_argument("--preset", help="Preset name", required=False, choices=PRESETS)
     parser.add_argument("--crf", type=int, required=False, help="From 0 (loseless), max depends of codec")
     parser.add_argument("--tune", required=False, choices=TUNES)
 
-    parser.add_argument("--output", "-o", default="/dev/null")
+    parser.add_argument("--output", "-o", default="/dev/null", help="File, or directory with a corpus of inputs")
     parser.add_argument('--output-format', "-f", required=False)
     parser.add_argument('--output-scale', required=False)
     parser.add_argument('--output-video-bitrate', '-ob:v', required=False)
     parser.add_argument("--output-video-codec", '-oc:v', required=False)
-    # parser.add_argument("--output-audio-codec", '-oc:a', required=False)
+    parser.add_argument("--output-audio-codec", '-oc:a', required=False)
+    parser.add_argument('--output-audio-bitrate', '-ob:a', required=False)
+    parser.add_argument('--output-audio-channel-layout', required=False, help="Like mono, stereo or 5.1")
+    parser.add_argument('--output-audio-sample-rate', type=int, required=False, help="Resample audio to this rate in Hz")
+    parser.add_argument('--audio-resampler', required=False, choices=RESAMPLERS)
     parser.add_argument("--output-disable-audio", action="store_true")
     parser.add_argument("--output-thread-queue-size", type=int, required=False, help="Max number of packets that may be queued to each muxing thread.")
 
@@ -88,6 +126,12 @@ def make_parser(subparsers):
 
     parser.add_argument("--hwaccel", default="none")
 
+    parser.add_argument("--mixed-audio-jobs", type=int, help="Audio-only jobs run alongside the video ones to measure interference")
+
+    parser.add_argument("--cgroup-cpus", type=float, nargs='+', help="CPU quota of each ffmpeg process, several values run a sweep")
+    parser.add_argument("--cgroup-memory", nargs='+', help="Memory limit of each ffmpeg process, like 2G, one value or one per --cgroup-cpus")
+    parser.add_argument("--enable-cgroup", action="store_true", dest="cgroup_enabled", help="Account CPU time of each ffmpeg process with a cgroup, implied by limits")
+
     parser.add_argument(
         '--disable-monitoring', action="store_false", dest="monitoring_enabled",
     )
@@ -100,6 +144,11 @@ def make_parser(subparsers):
     parser.add_argument(
         '--monitoring-output', default="/dev/stderr"
     )
+    corpus.add_arguments(parser)
+    parser.add_argument(
+        '--disable-energy', action="store_false", dest="energy_enabled",
+        help="Do not measure CPU energy with RAPL",
+    )
 
 
 class Transcoder:
@@ -112,7 +161,10 @@ class Transcoder:
         filter_threads=None,
 
         input_disable_audio=False,
+        input_disable_video=False,
         input_thread_queue_size=None,
+        input_start=None,
+        input_duration=None,
 
         preset=None,
         crf=None,
@@ -124,8 +176,17 @@ class Transcoder:
         output_video_codec=None,
         output_disable_audio=None,
         output_thread_queue_size=None,
+        output_threads=None,
+        output_audio_codec=None,
+        output_audio_bitrate=None,
+        output_audio_channel_layout=None,
+        output_audio_sample_rate=None,
+        audio_resampler=None,
 
         hwaccel='none',
+        cgroup_enabled=False,
+        cgroup_cpus=None,
+        cgroup_memory=None,
 
         verbosity=1,
     ):
@@ -135,7 +196,10 @@ class Transcoder:
 
         self.input = input
         self.input_disable_audio = input_disable_audio
+        self.input_disable_video = input_disable_video
         self.input_thread_queue_size = input_thread_queue_size
+        self.input_start = input_start
+        self.input_duration = input_duration
 
         self.preset = preset
         self.crf = crf
@@ -147,11 +211,58 @@ class Transcoder:
         self.output_video_codec = output_video_codec
         self.output_disable_audio = output_disable_audio
         self.output_thread_queue_size = output_thread_queue_size
+        self.output_threads = output_threads
+        self.output_audio_codec = output_audio_codec
+        self.output_audio_bitrate = output_audio_bitrate
+        self.output_audio_channel_layout = output_audio_channel_layout
+        self.output_audio_sample_rate = output_audio_sample_rate
+        self.audio_resampler = audio_resampler
 
         self.hwaccel = hwaccel
+        self.cgroup_cpus = cgroup_cpus
+        self.cgroup_memory = cgroup_memory
+        self.cgroup_enabled = cgroup_enabled or self.has_cgroup_limits
 
         self.verbosity = verbosity
 
+    @property
+    def has_cgroup_limits(self):
+        return self.cgroup_cpus is not None or self.cgroup_memory is not None
+
+    @property
+    def has_audio_options(self):
+        return self.input_disable_video or any(option is not None for option in (
+            self.output_audio_codec,
+            self.output_audio_bitrate,
+            self.output_audio_channel_layout,
+            self.output_audio_sample_rate,
+            self.audio_resampler,
+        ))
+
+    @property
+    def is_audio_transcoded(self):
+        return (
+            'input_audio_sample_rate' in self.input_probe_data
+            and not self.input_disable_audio
+            and not self.output_disable_audio
+            # A scaled output only maps the audio along with audio options
+            and (not self.output_scale or self.has_audio_options)
+        )
+
+    def get_audio_filters(self):
+        """Resampling and channel layout conversion, as a ``-af`` graph."""
+        filters = []
+        if self.output_audio_sample_rate or self.audio_resampler:
+            options = []
+            if self.output_audio_sample_rate:
+                options.append(f'osr={self.output_audio_sample_rate}')
+            if self.audio_resampler:
+                options.append(f'resampler={self.audio_resampler}')
+            filters.append('aresample=' + ':'.join(options))
+        if self.output_audio_channel_layout:
+            filters.append(f'aformat=channel_layouts={self.output_audio_channel_layout}')
+        return ','.join(filters)
+
     @property
     def input_probe(self):
         if not hasattr(self, '_input_probe'):
@@ -189,10 +300,13 @@ class Transcoder:
     def get_diff_data(self):
         if self.output == '/dev/null':
             return {}
-        in_bitrate = int(self.input_probe['streams'][0]['bit_rate'])
-        out_bitrate = int(self.output_probe['streams'][0]['bit_rate'])
-        bitrate_diff = out_bitrate - in_bitrate
-        bitrate_grow = (bitrate_diff / in_bitrate) * 100
+        bitrate_diff = bitrate_grow = None
+        # Matroska and WebM streams have no bit rate
+        in_bitrate = self.input_probe['streams'][0].get('bit_rate')
+        out_bitrate = self.output_probe['streams'][0].get('bit_rate')
+        if in_bitrate and out_bitrate:
+            bitrate_diff = int(out_bitrate) - int(in_bitrate)
+            bitrate_grow = (bitrate_diff / int(in_bitrate)) * 100
 
         in_size = int(self.input_probe['format']['size'])
         out_size = int(self.output_probe['format']['size'])
@@ -221,28 +335,102 @@ class Transcoder:
             pass
         return results
 
-    def run(self):
+    def get_cgroup_data(self, run_results, fpss):
+        """Summarize throttling of runs with cgroup limits, failed ones included."""
+        data = {
+            'cgroup_cpus': self.cgroup_cpus,
+            'cgroup_memory': self.cgroup_memory,
+            'oom_kill_count': sum(r.get('oom_kill') or 0 for r in run_results),
+        }
+        if not run_results:
+            return data
+        throttled_times = [r['throttled_time'] for r in run_results]
+        nr_throttleds = [r['nr_throttled'] or 0 for r in run_results]
+        throttled_ratios = [
+            (r['nr_throttled'] or 0) / r['nr_periods']
+            for r in run_results if r['nr_periods']
+        ]
+        data.update({
+            'throttled_times': throttled_times,
+            **handystats.full_stats(throttled_times, prefix='throttled_time_'),
+            **handystats.full_stats(nr_throttleds, prefix='nr_throttled_'),
+        })
+        if throttled_ratios:
+            data.update(handystats.full_stats(throttled_ratios, prefix='throttled_ratio_'))
+        memory_peaks = [r['memory_peak'] for r in run_results if 'memory_peak' in r]
+        if memory_peaks:
+            data.update(handystats.full_stats(memory_peaks, prefix='memory_peak_'))
+        if self.cgroup_cpus and fpss:
+            data['fps_per_cpu'] = sum(fpss) / len(fpss) / self.cgroup_cpus
+        return data
+
+    def get_audio_data(self, elapseds):
+        """Audio throughput in samples per second and realtime factor."""
+        duration = self.input_probe_data['input_audio_duration']
+        if self.input_start is not None:
+            duration = max(0, duration - self.input_start)
+        if self.input_duration is not None:
+            duration = min(duration, self.input_duration)
+        # audio_nb_frames counts codec frames, of codec-dependent sizes
+        nb_samples = duration * self.input_probe_data['input_audio_sample_rate']
+        data = {
+            'audio_nb_samples': round(nb_samples),
+            'audio_duration': duration,
+        }
+        if elapseds:
+            data.update(handystats.full_stats([nb_samples / e for e in elapseds], prefix='audio_samples_per_sec_'))
+            data.update(handystats.full_stats([duration / e for e in elapseds], prefix='audio_realtime_factor_'))
+        return data
+
+    def get_cpu_time(self, run_result, job_cgroup=None):
+        """CPU seconds of a run, from its cgroup or ffmpeg's -benchmark."""
+        if job_cgroup is not None:
+            return job_cgroup.cpu_time()
+        if 'utime' in run_result and 'stime' in run_result:
+            return float(run_result['utime']) + float(run_result['stime'])
+        return None
+
+    def release_cgroup(self, job_cgroup, result):
+        """Add the limit stats of a run to its result and remove its cgroup."""
+        if job_cgroup is None:
+            return
+        if self.has_cgroup_limits:
+            result.update(job_cgroup.get_limit_stats())
+        job_cgroup.remove()
+
+    def make_output_stream(self, extra_input_kwargs=None, extra_output_kwargs=None):
         # Make input
-        input_kwargs = {
+        input_kwargs: dict[str, Any] = {
             'hwaccel': self.hwaccel,
         }
         if self.input_disable_audio:
-            input_kwargs['an'] = None  # pyright: ignore
+            input_kwargs['an'] = None
+        if self.input_disable_video:
+            input_kwargs['vn'] = None
         if self.threads is not None:
             input_kwargs['threads'] = self.threads
         if self.filter_threads is not None:
             input_kwargs['filter_threads'] = self.filter_threads
         if self.input_thread_queue_size is not None:
             input_kwargs['thread_queue_size'] = self.input_thread_queue_size
+        if self.input_start is not None:
+            input_kwargs['ss'] = self.input_start
+        if self.input_duration is not None:
+            input_kwargs['t'] = self.input_duration
+        input_kwargs.update(extra_input_kwargs or {})
         logger.debug('Input kwargs: %s', input_kwargs)
         stream = ffmpeg.input(self.input, **input_kwargs)
+        streams = [stream]
         # Apply filter
         if self.output_scale:
-            stream = stream.filter(
+            streams = [stream.filter(
                 'scale', size=self.output_scale,
-            )
+            )]
+            # The filtered video is mapped alone, keep audio if it is benchmarked
+            if self.has_audio_options and not self.output_disable_audio:
+                streams.append(stream['a?'])
         # Make output
-        output_kwargs = {
+        output_kwargs: dict[str, Any] = {
             'benchmark': None,
         }
         if self.preset:
@@ -254,58 +442,134 @@ class Transcoder:
         if self.output_video_codec:
             output_kwargs['c:v'] = self.output_video_codec
         if self.output == '/dev/null':
-            output_kwargs['format'] = self.output_format or 'null'  # pyright: ignore
+            output_kwargs['format'] = self.output_format or 'null'
         if self.output_disable_audio:
             output_kwargs['an'] = None
         if self.output_thread_queue_size is not None:
             output_kwargs['thread_queue_size'] = self.output_thread_queue_size
-
+        if self.output_threads is not None:
+            output_kwargs['threads'] = self.output_threads
+        if self.output_audio_codec:
+            output_kwargs['c:a'] = self.output_audio_codec
+        if self.output_audio_bitrate:
+            output_kwargs['b:a'] = self.output_audio_bitrate
+        audio_filters = self.get_audio_filters()
+        if audio_filters:
+            output_kwargs['af'] = audio_filters
+
+        output_kwargs.update(extra_output_kwargs or {})
         logger.debug('Output kwargs: "%s", %s', self.output, output_kwargs)
-        output_stream = stream.output(self.output, **output_kwargs)
+        output_stream = ffmpeg.output(*streams, self.output, **output_kwargs)
+        return output_stream
+
+    def run(self):
+        if self.has_cgroup_limits:
+            controllers = []
+            if self.cgroup_cpus is not None:
+                controllers.append('cpu')
+            if self.cgroup_memory is not None:
+                controllers.append('memory')
+            cgroup.enable_controllers(controllers)
+        output_stream = self.make_output_stream()
         # Run transcoding
         def _run(i):
             logger.info("Started stream #%s", i)
             cmd_logger.debug(output_stream)
+            job_cgroup = None
+            if self.cgroup_enabled:
+                try:
+                    job_cgroup = cgroup.Cgroup(f"ffmpeg-benchmark-{os.getpid()}-{i}").create()
+                    job_cgroup.set_limits(cpus=self.cgroup_cpus, memory=self.cgroup_memory)
+                except OSError as err:
+                    if job_cgroup is not None:
+                        job_cgroup.remove()
+                        job_cgroup = None
+                    if self.has_cgroup_limits:
+                        raise
+                    logger.warning("Cannot create cgroup: %s", err)
             t0 = time.time()
             try:
-                stdout, stderr = output_stream.run(
-                    capture_stdout=True,
-                    capture_stderr=True,
-                    overwrite_output=True,
-                )
+                try:
+                    process = output_stream.run_async(
+                        pipe_stdout=True,
+                        pipe_stderr=True,
+                        overwrite_output=True,
+                    )
+                except Exception:
+                    if job_cgroup is not None:
+                        job_cgroup.remove()
+                    raise
+                if job_cgroup is not None:
+                    try:
+                        job_cgroup.add(process.pid)
+                    except OSError as err:
+                        if self.has_cgroup_limits:
+                            process.kill()
+                            process.wait()
+                            job_cgroup.remove()
+                            raise
+                        logger.warning("Cannot move ffmpeg in cgroup: %s", err)
+                        job_cgroup.remove()
+                        job_cgroup = None
+                stdout, stderr = process.communicate()
                 elapsed = time.time() - t0
+                if process.returncode:
+                    raise ffmpeg.Error('ffmpeg', stdout, stderr)
             except ffmpeg._run.Error as err:
                 logger.info("stderr: %s", err.stderr.decode())
-                return {
+                result = {
                     'ok': False,
                     'stdout': err.stdout,
                     'stderr': err.stderr,
                     **self.parse_output(err.stdout, err.stderr),
                 }
+                # OOM kills end here, keep the cgroup stats
+                self.release_cgroup(job_cgroup, result)
+                return result
             if self.verbosity >= 4:
                 logger.debug("stdout: %s", stdout.decode())
                 logger.debug("stderr: %s", stderr.decode())
-            return {
+            result = {
                 'ok': True,
                 'elapsed': elapsed,
                 'stdout': stdout,
                 'stderr': stderr,
                 **self.parse_output(stdout, stderr),
             }
+            result['cpu_time'] = self.get_cpu_time(result, job_cgroup)
+            result['cpu_time_source'] = 'benchmark' if job_cgroup is None else 'cgroup'
+            self.release_cgroup(job_cgroup, result)
+            return result
 
         futures = []
         with ThreadPoolExecutor(max_workers=self.processes) as executor:
             for i in range(self.processes):
                 futures.append(executor.submit(_run, i))
-        results = [f.result() for f in futures]
+        run_results = [f.result() for f in futures]
         # Compute values
-        ffmpeg_version = results[0]['ffmpeg_version']
-
-        elapseds = [r['elapsed'] for r in results if r['ok']]
-        in_nb_frames = self.input_probe_data['input_video_nb_frames']
-        fpss = [(in_nb_frames/e) for e in elapseds]
-        errors = [r for r in results if not r['ok']]
+        ffmpeg_version = run_results[0]['ffmpeg_version']
+
+        elapseds = [r['elapsed'] for r in run_results if r['ok']]
+        cpu_times = [r['cpu_time'] for r in run_results if r['ok']]
+        in_nb_frames = None
+        fpss = []
+        if not self.input_disable_video:
+            in_nb_frames = self.input_probe_data['input_video_nb_frames']
+            frame_rate = self.input_probe_data.get('input_video_frame_rate')
+            if frame_rate:
+                if in_nb_frames is None:
+                    in_nb_frames = round(self.input_probe_data['input_duration'] * frame_rate)
+                if self.input_duration is not None:
+                    in_nb_frames = min(in_nb_frames, round(self.input_duration * frame_rate))
+            fpss = [(in_nb_frames/e) for e in elapseds]
+        errors = [r for r in run_results if not r['ok']]
         error_count = len(errors)
+        # Runs fall back to -benchmark when their cgroup cannot be used
+        cpu_time_sources = {r['cpu_time_source'] for r in run_results if r['ok']}
+        if len(cpu_time_sources) > 1:
+            cpu_time_source = 'mixed'
+        else:
+            cpu_time_source = next(iter(cpu_time_sources), None)
 
         results = {
             'ffmpeg_version': ffmpeg_version,
@@ -320,7 +584,11 @@ class Transcoder:
             'input': self.input,
             **self.input_probe_data,
             'input_disable_audio': self.input_disable_audio,
+            'input_disable_video': self.input_disable_video,
             'input_thread_queue_size': self.input_thread_queue_size,
+            'input_start': self.input_start,
+            'input_duration': self.input_duration,
+            'nb_frames': in_nb_frames,
 
             'output': self.output,
             **self.output_probe_data,
@@ -329,14 +597,27 @@ class Transcoder:
             'output_video_codec': self.output_video_codec,
             'output_disable_audio': self.output_disable_audio,
             'output_thread_queue_size': self.output_thread_queue_size,
+            'output_threads': self.output_threads,
+            'output_audio_codec': self.output_audio_codec,
+            'output_audio_bitrate': self.output_audio_bitrate,
+            'output_audio_channel_layout': self.output_audio_channel_layout,
+            'output_audio_sample_rate': self.output_audio_sample_rate,
+            'audio_resampler': self.audio_resampler,
             **self.get_diff_data(),
 
             'error_count': error_count,
             'elapseds': elapseds,
             'fpss': fpss,
+            'cpu_times': cpu_times,
+            'cpu_time_source': cpu_time_source,
             **handystats.full_stats(elapseds, prefix='elapsed_'),
-            **handystats.full_stats(fpss, prefix='fps_'),
         }
+        if not self.input_disable_video:
+            results.update(handystats.full_stats(fpss, prefix='fps_'))
+        if self.is_audio_transcoded:
+            results.update(self.get_audio_data(elapseds))
+        if self.has_cgroup_limits:
+            results.update(self.get_cgroup_data(run_results, fpss))
 
         return results
 
@@ -347,15 +628,127 @@ def transcode(**kwargs):
     return results
 
 
-def main(args):
-    probe_manager = None  # Initialize probe_manager
+def get_pod_sizes(cpus=None, memories=None):
+    """Pair CPU quotas with memory limits, as (cpus, memory) tuples."""
+    cpus = cpus or [None]
+    memories = memories or [None]
+    if len(memories) == 1:
+        memories = memories * len(cpus)
+    elif len(cpus) == 1:
+        cpus = cpus * len(memories)
+    if len(cpus) != len(memories):
+        raise ValueError("--cgroup-memory must have one value or as many as --cgroup-cpus")
+    return list(zip(cpus, memories))
+
+
+def sweep_pod_sizes(pod_sizes, **kwargs):
+    """Run transcode for each pod size, per-run keys are prefixed by pod."""
+    results = {
+        'pod_sizes': [],
+        'error_count': 0,
+        'elapseds': [],
+        'cpu_times': [],
+    }
+    for cpus, memory in pod_sizes:
+        label = '_'.join(str(v) for v in (f"{cpus:g}cpu" if cpus else None, memory) if v)
+        logger.info("Running with pod size %s", label)
+        pod_results = transcode(cgroup_cpus=cpus, cgroup_memory=memory, **kwargs)
+        results['pod_sizes'].append(label)
+        results['error_count'] += pod_results['error_count']
+        results['elapseds'] += pod_results['elapseds']
+        results['cpu_times'] += pod_results['cpu_times']
+        for key, value in pod_results.items():
+            if key.startswith(SWEEP_PREFIXES):
+                results[f"pod_{label}_{key}"] = value
+            elif key not in results:
+                results[key] = value
+    return results
+
+
+def run_mixed(audio_jobs, **kwargs):
+    """
+    Run the video jobs alone, ``audio_jobs`` audio-only jobs alone, then
+    both at once, and report how much each slows the other down.
+    """
+    audio_kwargs = {
+        **kwargs,
+        'processes': audio_jobs,
+        'input_disable_video': True,
+        'preset': None,
+        'crf': None,
+        'tune': None,
+        'output': '/dev/null',
+        'output_format': None,
+        'output_scale': None,
+        'output_video_codec': None,
+    }
+    logger.info("Running video jobs alone")
+    results = transcode(**kwargs)
+    logger.info("Running %s audio jobs alone", audio_jobs)
+    audio_alone = transcode(**audio_kwargs)
+    logger.info("Running video and audio jobs together")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        video_future = executor.submit(transcode, **kwargs)
+        audio_future = executor.submit(transcode, **audio_kwargs)
+        video_mixed = video_future.result()
+        audio_mixed = audio_future.result()
+
+    results['mixed_audio_jobs'] = audio_jobs
+    for label, data in (
+        ('audio_alone', audio_alone),
+        ('audio_mixed', audio_mixed),
+        ('video_mixed', video_mixed),
+    ):
+        results.update({
+            f"{label}_{key}": data[key]
+            for key in MIXED_KEYS if key in data
+        })
+    if results.get('fps_mean') and video_mixed.get('fps_mean'):
+        results['video_slowdown_percent'] = (1 - video_mixed['fps_mean'] / results['fps_mean']) * 100
+    alone_rate = audio_alone.get('audio_samples_per_sec_mean')
+    mixed_rate = audio_mixed.get('audio_samples_per_sec_mean')
+    if alone_rate and mixed_rate:
+        results['audio_slowdown_percent'] = (1 - mixed_rate / alone_rate) * 100
+    return results
+
 
+def make_title_args(args, entry):
+    args.input = entry['input']
+    if args.output != '/dev/null':
+        args.output = os.path.join(args.output, entry['name'] + os.path.splitext(entry['input'])[1])
+    args.psnr_stats_file = corpus.title_filename(args.psnr_stats_file, entry['name'])
+    args.vmaf_stats_file = corpus.title_filename(args.vmaf_stats_file, entry['name'])
+    return args
+
+
+def main(args):
     if args.input.startswith("http://") or args.input.startswith("https://"):
         logger.info("Downloading input file from %s", args.input)
         tmpdir = TemporaryDirectory()
         atexit.register(tmpdir.cleanup)
         args.input = utils.download_video_file(args.input, tmpdir.name + "/input.mp4")
 
+    host_info = sysinfo.get_sysinfo()
+    sysinfo.validate_transcode(
+        host_info, vars(args),
+        enable_psnr=args.enable_psnr,
+        enable_vmaf=args.enable_vmaf,
+    )
+
+    if corpus.is_corpus(args.input):
+        if args.output != '/dev/null':
+            os.makedirs(args.output, exist_ok=True)
+        entries = corpus.list_inputs(args.input)
+        results = corpus.run(entries, benchmark, make_title_args, args)
+    else:
+        results = benchmark(args)
+    results.update(sysinfo.summarize(host_info))
+    return results
+
+
+def benchmark(args):
+    probe_manager = None  # Initialize probe_manager
+
     if args.monitoring_enabled:
         if has_probes:
             monitoring_probers = args.monitoring_probers
@@ -380,34 +773,92 @@ def main(args):
             logger.warning("Monitoring is enabled but probes module is not available. Monitoring will be disabled.")
             # probe_manager remains None, so monitoring features dependent on it won't run
 
+    if args.mixed_audio_jobs and (args.input_disable_audio or args.output_disable_audio):
+        raise ValueError("--mixed-audio-jobs needs audio enabled")
+    energy_meter = None
+    # Energy of a mixed run covers several phases, and RAPL counters of
+    # parallel corpus titles include each other's work
+    if args.energy_enabled and not args.mixed_audio_jobs and args.corpus_parallel <= 1:
+        energy_meter = energy.EnergyMeter()
+        if energy_meter.available:
+            energy_meter.start()
+            logger.info("Started energy measurement")
+        else:
+            logger.info("RAPL is not available, energy measurement is disabled")
+            energy_meter = None
+
+    pod_sizes = get_pod_sizes(args.cgroup_cpus, args.cgroup_memory)
+    transcode_kwargs = dict(
+        hwaccel=args.hwaccel,
+        processes=args.processes,
+        threads=args.threads,
+        filter_threads=args.filter_threads,
+
+        input=args.input,
+        input_disable_audio=args.input_disable_audio,
+        input_disable_video=args.input_disable_video,
+        input_thread_queue_size=args.input_thread_queue_size,
+
+        preset=args.preset,
+        crf=args.crf,
+        tune=args.tune,
+
+        output=args.output,
+        output_format=args.output_format,
+        output_scale=args.output_scale,
+        output_video_codec=args.output_video_codec,
+        output_disable_audio=args.output_disable_audio,
+        output_thread_queue_size=args.output_thread_queue_size,
+        output_audio_codec=args.output_audio_codec,
+        output_audio_bitrate=args.output_audio_bitrate,
+        output_audio_channel_layout=args.output_audio_channel_layout,
+        output_audio_sample_rate=args.output_audio_sample_rate,
+        audio_resampler=args.audio_resampler,
+
+        cgroup_enabled=args.cgroup_enabled,
+        verbosity=args.verbosity,
+    )
     try:
-        results = transcode(
-            hwaccel=args.hwaccel,
-            processes=args.processes,
-            threads=args.threads,
-            filter_threads=args.filter_threads,
-
-            input=args.input,
-            input_disable_audio=args.input_disable_audio,
-            input_thread_queue_size=args.input_thread_queue_size,
-
-            preset=args.preset,
-            crf=args.crf,
-            tune=args.tune,
-
-            output=args.output,
-            output_format=args.output_format,
-            output_scale=args.output_scale,
-            output_video_codec=args.output_video_codec,
-            output_disable_audio=args.output_disable_audio,
-            output_thread_queue_size=args.output_thread_queue_size,
-
-            verbosity=args.verbosity,
-        )
+        if args.mixed_audio_jobs and len(pod_sizes) > 1:
+            raise ValueError("--mixed-audio-jobs cannot be used with a pod size sweep")
+        if args.mixed_audio_jobs:
+            cpus, memory = pod_sizes[0]
+            results = run_mixed(args.mixed_audio_jobs, cgroup_cpus=cpus, cgroup_memory=memory, **transcode_kwargs)
+        elif len(pod_sizes) > 1:
+            results = sweep_pod_sizes(pod_sizes, **transcode_kwargs)
+        else:
+            cpus, memory = pod_sizes[0]
+            results = transcode(cgroup_cpus=cpus, cgroup_memory=memory, **transcode_kwargs)
     except Exception:
         if probe_manager:  # Check if probe_manager was initialized
             probe_manager.stop()
+        if energy_meter:
+            energy_meter.stop()
         raise
+    # Add energy data
+    if energy_meter:
+        energy_meter.stop()
+        logger.info("Stopped energy measurement")
+        results.update(energy_meter.get_results())
+        joules = results['energy_joules']
+        nb_frames = results['nb_frames']
+        size = results.get('output_size')
+        nb_ok = len(results['elapseds'])
+        if nb_frames is not None:
+            results.update(energy.efficiency(
+                joules,
+                frames=nb_frames * nb_ok,
+                size=size * nb_ok if size is not None else None,
+            ))
+        # Split energy between simultaneous jobs by their CPU time
+        cpu_times = results['cpu_times']
+        if nb_frames and len(cpu_times) > 1 and None not in cpu_times and sum(cpu_times):
+            job_joules = [joules * t / sum(cpu_times) for t in cpu_times]
+            results.update(handystats.full_stats(job_joules, prefix='job_energy_joules_'))
+            results.update(handystats.full_stats(
+                [nb_frames / j for j in job_joules if j],
+                prefix='job_frames_per_joule_',
+            ))
     # Add monitoring data
     if probe_manager:  # Check if probe_manager was initialized
         probe_manager.stop()
@@ -427,8 +878,8 @@ def main(args):
             temps = [v['temperature'] for v in probe_data['nvidia'].values()]
             results.update(handystats.full_stats(temps, prefix='nvidia_temperature_'))
     # Handle errors
-    if args.processes == results['error_count']:
-        logger.error('All operations failed (%s)', args.processes)
+    if args.processes * len(pod_sizes) == results['error_count']:
+        logger.error('All operations failed (%s)', results['error_count'])
         return results
     # Add PSNR data
     if args.enable_psnr and args.output == '/dev/null':
@@ -0,0 +1,436 @@
+import os
+import json
+import math
+import socket
+import hashlib
+import logging
+from tempfile import TemporaryDirectory
+from concurrent.futures import ThreadPoolExecutor
+
+from ffmpeg_benchmark import probe
+from ffmpeg_benchmark import transcode
+from ffmpeg_benchmark import vmaf
+from ffmpeg_benchmark import estimate
+from ffmpeg_benchmark import sysinfo
+from ffmpeg_benchmark import utils
+
+logger = logging.getLogger('ffmpeg_benchmark')
+
+TARGET_VMAF = 93
+CRF_MIN = 15
+CRF_MAX = 40
+SNIPPETS = 4
+SNIPPET_DURATION = 4
+# Reduction factor of successive halving, also the growth of snippets per rung
+ETA = 2
+
+
+def make_parser(subparsers):
+    parser = subparsers.add_parser("tune", help="Search the fastest settings meeting a quality and bitrate target")
+
+    parser.add_argument("--input", "-i", required=True)
+
+    parser.add_argument("--target-vmaf", type=float, default=TARGET_VMAF, help="Minimum VMAF, 0 to only target a bitrate")
+    parser.add_argument("--max-bitrate", help="Maximum video bitrate, like 5M")
+
+    parser.add_argument("--presets", nargs='+', default=list(transcode.PRESETS), choices=transcode.PRESETS, help="Presets searched")
+    parser.add_argument("--threads", type=int, nargs='+', help="Thread counts searched")
+    parser.add_argument("--crf-min", type=int, default=CRF_MIN)
+    parser.add_argument("--crf-max", type=int, default=CRF_MAX)
+    parser.add_argument("--tune", required=False, choices=transcode.TUNES)
+
+    parser.add_argument('--output-scale', required=False)
+    parser.add_argument("--output-video-codec", '-oc:v', required=False)
+
+    parser.add_argument("--hwaccel", default="none")
+
+    parser.add_argument("--snippets", "-k", type=int, default=SNIPPETS, help="Number of snippets of the last rung")
+    parser.add_argument("--snippet-duration", type=float, default=SNIPPET_DURATION, help="Duration of each snippet in seconds")
+    parser.add_argument("--eta", type=int, default=ETA, help="Candidates kept per rung are divided by this factor")
+    parser.add_argument("--score-workers", type=int, default=os.cpu_count(), help="Number of snippets scored at once")
+    parser.add_argument("--disable-cache", action="store_false", dest="cache_enabled", help="Do not reuse points evaluated by previous runs")
+
+
+def bisect_last(predicate, lo, hi, hint=None):
+    """
+    Largest ``x`` in ``[lo, hi]`` satisfying ``predicate``, which must hold
+    up to some value and no further. A ``hint`` near the answer is probed
+    first with growing steps. Return None if no value qualifies.
+    """
+    if hint is not None and lo <= hint <= hi:
+        step = 1
+        if predicate(hint):
+            lo = hint
+            while lo < hi:
+                x = min(hi, lo + step)
+                if not predicate(x):
+                    hi = x - 1
+                    break
+                lo = x
+                step *= 2
+        else:
+            hi = hint - 1
+            while lo < hi:
+                x = max(lo, hi - step)
+                if predicate(x):
+                    lo = x
+                    break
+                hi = x - 1
+                step *= 2
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if predicate(mid):
+            lo = mid
+        else:
+            hi = mid - 1
+    if lo > hi or not predicate(lo):
+        return None
+    return lo
+
+
+def dominates(a, b):
+    """Whether point ``a`` is at least as fast, good and small as ``b``, and better once."""
+    not_worse = a['fps'] >= b['fps'] and a['vmaf'] >= b['vmaf'] and a['bitrate'] <= b['bitrate']
+    better = a['fps'] > b['fps'] or a['vmaf'] > b['vmaf'] or a['bitrate'] < b['bitrate']
+    return not_worse and better
+
+
+def pareto_frontier(points):
+    """Points not dominated on FPS, VMAF and bitrate, fastest first."""
+    frontier = [p for p in points if not any(dominates(o, p) for o in points)]
+    return sorted(frontier, key=lambda p: -p['fps'])
+
+
+def get_label(preset, crf, threads):
+    label = f"{preset}_crf{crf}"
+    if threads is not None:
+        label += f"_t{threads}"
+    return label
+
+
+class Tuner:
+    """
+    Find the fastest preset, CRF and threads meeting a VMAF and bitrate
+    target.
+
+    Candidates, every preset and thread count, go through successive
+    halving: each rung evaluates them on more snippets and keeps the
+    fastest feasible ``1/eta``. For each candidate the highest CRF
+    meeting the VMAF target is found by bisection, starting from the CRF
+    found for the same preset. Measurements are cached per snippet, so a
+    rung only encodes its new snippets, and on disk across runs.
+    """
+    def __init__(
+        self,
+        input,
+
+        target_vmaf=TARGET_VMAF,
+        max_bitrate=None,
+
+        presets=transcode.PRESETS,
+        threads=None,
+        crf_min=CRF_MIN,
+        crf_max=CRF_MAX,
+        tune=None,
+
+        output_scale=None,
+        output_video_codec=None,
+
+        hwaccel='none',
+
+        snippets=SNIPPETS,
+        snippet_duration=SNIPPET_DURATION,
+        eta=ETA,
+        score_workers=None,
+        cache_enabled=True,
+
+        verbosity=1,
+    ):
+        self.input = input
+
+        self.target_vmaf = target_vmaf or None
+        self.max_bitrate = utils.parse_bitrate(max_bitrate) if max_bitrate else None
+        if self.target_vmaf is None and self.max_bitrate is None:
+            raise ValueError("A VMAF or bitrate target is required")
+
+        self.presets = list(presets)
+        self.threads = list(threads or [None])
+        self.crf_min = crf_min
+        self.crf_max = crf_max
+        self.tune = tune
+
+        self.output_scale = output_scale
+        self.output_video_codec = output_video_codec
+
+        self.hwaccel = hwaccel
+
+        self.snippets = snippets
+        self.snippet_duration = snippet_duration
+        self.eta = eta
+        self.score_workers = score_workers or os.cpu_count()
+        self.cache_enabled = cache_enabled
+
+        self.verbosity = verbosity
+
+        self.measurements = {}
+        self.encodes = 0
+        self.cache_hits = 0
+
+    @property
+    def input_probe_data(self):
+        if not hasattr(self, '_input_probe_data'):
+            self._input_probe_data = probe.extract_data(probe.probe(self.input))
+        return self._input_probe_data
+
+    @property
+    def cache_file(self):
+        """Cache of measurements, per input, encoder settings and host."""
+        key = json.dumps([
+            probe.get_cache_key(self.input),
+            self.output_video_codec,
+            self.output_scale,
+            self.tune,
+            self.hwaccel,
+            self.snippet_duration,
+            socket.gethostname(),
+            sysinfo.get_ffmpeg_binary(),
+        ])
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return sysinfo.CACHE_DIR / f'tune-{digest}.json'
+
+    def load_cache(self):
+        if not self.cache_enabled or not self.cache_file.exists():
+            return
+        try:
+            with self.cache_file.open() as fd:
+                self.measurements = json.load(fd)
+            logger.debug("Loaded %s measurements from %s", len(self.measurements), self.cache_file)
+        except (OSError, ValueError) as err:
+            logger.warning("Cannot read tune cache: %s", err)
+
+    def save_cache(self):
+        if not self.cache_enabled:
+            return
+        try:
+            sysinfo.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            with self.cache_file.open('w') as fd:
+                json.dump(self.measurements, fd)
+        except OSError as err:
+            logger.warning("Cannot cache tune measurements: %s", err)
+
+    def encode(self, preset, crf, threads, snippet, workdir):
+        output = os.path.join(workdir, f"{get_label(preset, crf, threads)}-{snippet['start']:.3f}.mkv")
+        transcoder = transcode.Transcoder(
+            input=self.input,
+            threads=threads,
+            input_start=snippet['start'],
+            input_duration=self.snippet_duration,
+            preset=preset,
+            crf=crf,
+            tune=self.tune,
+            output=output,
+            output_scale=self.output_scale,
+            output_video_codec=self.output_video_codec,
+            output_disable_audio=True,
+            hwaccel=self.hwaccel,
+            verbosity=self.verbosity,
+        )
+        result = transcoder.run()
+        if result['error_count']:
+            raise ValueError(f"Encoding of {get_label(preset, crf, threads)} at {snippet['start']}s failed")
+        self.encodes += 1
+        return output, {
+            'elapsed': result['elapsed_mean'],
+            'frames': result['nb_frames'],
+            'size': result['output_size'],
+        }
+
+    def score(self, output, snippet, measurement):
+        stats_file = os.path.splitext(output)[0] + '.json'
+        measurement['vmaf'] = vmaf.vmaf(
+            ori_input=self.input,
+            new_input=output,
+            stats_file=stats_file,
+            ori_start=snippet['start'],
+            ori_duration=self.snippet_duration,
+        )['vmaf_mean']
+        os.remove(output)
+        os.remove(stats_file)
+
+    def evaluate(self, preset, crf, threads, snippets, workdir):
+        """Weighted FPS, VMAF and bitrate of a point on ``snippets``."""
+        keys = [f"{get_label(preset, crf, threads)}@{s['start']:.3f}" for s in snippets]
+        new = [(key, s) for key, s in zip(keys, snippets) if key not in self.measurements]
+        self.cache_hits += len(snippets) - len(new)
+        # Encodes run one at a time to keep FPS comparable, scoring is parallel
+        encoded = []
+        for key, snippet in new:
+            output, measurement = self.encode(preset, crf, threads, snippet, workdir)
+            encoded.append((key, snippet, output, measurement))
+        with ThreadPoolExecutor(max_workers=self.score_workers) as executor:
+            list(executor.map(lambda e: self.score(e[2], e[1], e[3]), encoded))
+        if encoded:
+            for key, _, _, measurement in encoded:
+                self.measurements[key] = measurement
+            self.save_cache()
+
+        measurements = [self.measurements[key] for key in keys]
+        spf, _ = estimate.stratified_estimate([m['elapsed'] / m['frames'] for m in measurements], snippets)
+        bpf, _ = estimate.stratified_estimate([m['size'] / m['frames'] for m in measurements], snippets)
+        vmaf_mean, _ = estimate.stratified_estimate([m['vmaf'] for m in measurements], snippets)
+        frame_rate = self.input_probe_data.get('video_frame_rate') or 1
+        return {
+            'preset': preset,
+            'crf': crf,
+            'threads': threads,
+            'snippets': len(snippets),
+            'fps': 1 / spf,
+            'vmaf': vmaf_mean,
+            'bitrate': bpf * 8 * frame_rate,
+        }
+
+    def search_crf(self, preset, threads, snippets, workdir, hint=None):
+        """Evaluate the highest CRF meeting the VMAF target and check the bitrate."""
+        points = {}
+
+        def point(crf):
+            if crf not in points:
+                points[crf] = self.evaluate(preset, crf, threads, snippets, workdir)
+            return points[crf]
+
+        if self.target_vmaf is not None:
+            crf = bisect_last(
+                lambda c: point(c)['vmaf'] >= self.target_vmaf,
+                self.crf_min, self.crf_max, hint,
+            )
+        else:
+            # The bitrate falls as CRF grows, search on the negated axis
+            crf = bisect_last(
+                lambda c: point(-c)['bitrate'] <= self.max_bitrate,
+                -self.crf_max, -self.crf_min, -hint if hint is not None else None,
+            )
+            crf = -crf if crf is not None else None
+        if crf is None or not self.is_feasible(point(crf)):
+            return None, list(points.values())
+        return point(crf), list(points.values())
+
+    def is_feasible(self, point):
+        if self.target_vmaf is not None and point['vmaf'] < self.target_vmaf:
+            return False
+        if self.max_bitrate is not None and point['bitrate'] > self.max_bitrate:
+            return False
+        return True
+
+    def run(self):
+        self.load_cache()
+        with TemporaryDirectory() as workdir:
+            frames = estimate.analyse(self.input, workdir)
+            windows = estimate.make_windows(frames, self.snippet_duration)
+            # Most representative snippets first, early rungs only use those
+            snippets = sorted(
+                estimate.select_snippets(windows, self.snippets, per_stratum=1),
+                key=lambda s: -s['weight'],
+            )
+            logger.info("Selected snippets at %s", [s['start'] for s in snippets])
+
+            candidates = [(preset, threads) for preset in self.presets for threads in self.threads]
+            nb_candidates = len(candidates)
+            crf_hints = {}
+            nb_snippets = 1
+            rungs = 0
+            while True:
+                rungs += 1
+                logger.info("Rung %s: %s candidates on %s snippets", rungs, len(candidates), nb_snippets)
+                best_points = []
+                final_points = []
+                for preset, threads in candidates:
+                    best, points = self.search_crf(
+                        preset, threads, snippets[:nb_snippets], workdir,
+                        hint=crf_hints.get(preset),
+                    )
+                    final_points += points
+                    if best is not None:
+                        crf_hints[preset] = best['crf']
+                        best_points.append(best)
+                if nb_snippets >= len(snippets) or not best_points:
+                    break
+                best_points.sort(key=lambda p: -p['fps'])
+                kept = best_points[:max(1, math.ceil(len(best_points) / self.eta))]
+                candidates = [(p['preset'], p['threads']) for p in kept]
+                nb_snippets = min(len(snippets), nb_snippets * self.eta)
+
+        nb_crfs = self.crf_max - self.crf_min + 1
+        grid_encodes = nb_candidates * nb_crfs * len(snippets)
+        results = {
+            'input': self.input,
+            **{f"input_{key}": value for key, value in self.input_probe_data.items()},
+            'output_scale': self.output_scale,
+            'output_video_codec': self.output_video_codec,
+            'tune': self.tune,
+            'hwaccel': self.hwaccel,
+
+            'target_vmaf': self.target_vmaf,
+            'max_bitrate': self.max_bitrate,
+            'candidates': nb_candidates,
+            'rungs': rungs,
+            'snippets': len(snippets),
+            'snippet_duration': self.snippet_duration,
+            'snippet_starts': [s['start'] for s in snippets],
+
+            'encodes': self.encodes,
+            'cache_hits': self.cache_hits,
+            'grid_encodes': grid_encodes,
+            'encode_ratio_percent': self.encodes / grid_encodes * 100,
+        }
+        feasible = [p for p in final_points if self.is_feasible(p)]
+        if feasible:
+            best = max(feasible, key=lambda p: p['fps'])
+            results.update({f'best_{key}': value for key, value in best.items()})
+        else:
+            logger.error("No settings meet the targets")
+        frontier = pareto_frontier(final_points)
+        results['frontier'] = [get_label(p['preset'], p['crf'], p['threads']) for p in frontier]
+        for point in frontier:
+            label = get_label(point['preset'], point['crf'], point['threads'])
+            for key in ('fps', 'vmaf', 'bitrate'):
+                results[f'frontier_{label}_{key}'] = point[key]
+        return results
+
+
+def tune(**kwargs):
+    tuner = Tuner(**kwargs)
+    results = tuner.run()
+    return results
+
+
+def main(args):
+    host_info = sysinfo.get_sysinfo()
+    sysinfo.validate_transcode(host_info, vars(args), enable_vmaf=True)
+    sysinfo.validate(host_info, encoders=[estimate.ANALYSIS_CODEC], filters=['select', 'metadata'])
+    results = tune(
+        input=args.input,
+
+        target_vmaf=args.target_vmaf,
+        max_bitrate=args.max_bitrate,
+
+        presets=args.presets,
+        threads=args.threads,
+        crf_min=args.crf_min,
+        crf_max=args.crf_max,
+        tune=args.tune,
+
+        output_scale=args.output_scale,
+        output_video_codec=args.output_video_codec,
+
+        hwaccel=args.hwaccel,
+
+        snippets=args.snippets,
+        snippet_duration=args.snippet_duration,
+        eta=args.eta,
+        score_workers=args.score_workers,
+        cache_enabled=args.cache_enabled,
+
+        verbosity=args.verbosity,
+    )
+    results.update(sysinfo.summarize(host_info))
+    return results
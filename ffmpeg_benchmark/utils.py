@@ -4,9 +4,11 @@ from pathlib import Path
 from shutil import copyfileobj
 from zipfile import ZipFile
 import re
+import statistics
 import requests
 
 RE_VERSION = re.compile(r'\d+\.\d+\.\d+')
+BITRATE_UNITS = {'K': 1e3, 'M': 1e6, 'G': 1e9}
 
 
 def parse_version(line):
@@ -15,6 +17,15 @@ def parse_version(line):
         return search.group()
 
 
+def parse_bitrate(value):
+    """Convert bitrates like ``800k`` or ``5M`` to bits per second."""
+    value = str(value).strip()
+    unit = value[-1:].upper()
+    if unit in BITRATE_UNITS:
+        return float(value[:-1]) * BITRATE_UNITS[unit]
+    return float(value)
+
+
 def download_video_file(url, filename):
     """
     Download a video file from a given URL and save it to a specified filename.
@@ -48,3 +59,19 @@ def download_video_file(url, filename):
             tmpfile.rename(filename)
 
     return filename
+
+
+def percentiles(data, prefix='', percents=(50, 95, 99)):
+    """
+    Compute the given percentiles of a series, keys are named like ``{prefix}p95``.
+    """
+    data = sorted(data)
+    if not data:
+        return {}
+    if len(data) == 1:
+        return {f"{prefix}p{percent}": data[0] for percent in percents}
+    quantiles = statistics.quantiles(data, n=100, method='inclusive')
+    return {
+        f"{prefix}p{percent}": quantiles[percent - 1]
+        for percent in percents
+    }
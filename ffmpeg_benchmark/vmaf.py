@@ -4,6 +4,8 @@ import time
 import ffmpeg
 import handystats
 from ffmpeg_benchmark import probe
+from ffmpeg_benchmark import corpus
+from ffmpeg_benchmark import sysinfo
 
 logger = logging.getLogger('ffmpeg_benchmark')
 cmd_logger = logging.getLogger('ffmpeg_benchmark_cmd')
@@ -17,6 +19,7 @@ def make_parser(subparsers):
     parser.add_argument("--original-input", "-i", required=True)
     parser.add_argument("--new-input", "-I", required=True)
     parser.add_argument("--stats-file", default=STATS_FILE)
+    corpus.add_arguments(parser)
 
 
 def vmaf(
@@ -25,8 +28,15 @@ def vmaf(
     stats_file=STATS_FILE,
     ori_probe=None,
     new_probe=None,
+    ori_start=None,
+    ori_duration=None,
 ):
-    ori_stream = ffmpeg.input(ori_input)
+    ori_kwargs = {}
+    if ori_start is not None:
+        ori_kwargs['ss'] = ori_start
+    if ori_duration is not None:
+        ori_kwargs['t'] = ori_duration
+    ori_stream = ffmpeg.input(ori_input, **ori_kwargs)
     new_stream = ffmpeg.input(new_input)
 
     ori_probe = ori_probe or probe.probe(ori_input)
@@ -49,7 +59,7 @@ def vmaf(
         )
         streams = (new_rescaled, ori_rescaled)
     else:
-        streams = (new_stream, new_stream)
+        streams = (new_stream, ori_stream)
 
     filter_graph = ffmpeg.filter(
         stream_spec=streams,
@@ -100,10 +110,29 @@ def vmaf(
     }
 
 
-def main(args):
+def run(args):
     results = vmaf(
         ori_input=args.original_input,
         new_input=args.new_input,
         stats_file=args.stats_file,
     )
     return results
+
+
+def make_title_args(args, entry):
+    args.original_input = entry['input']
+    args.new_input = entry['new_input']
+    args.stats_file = corpus.title_filename(args.stats_file, entry['name'])
+    return args
+
+
+def main(args):
+    host_info = sysinfo.get_sysinfo()
+    sysinfo.validate(host_info, filters=['libvmaf'])
+    if corpus.is_corpus(args.original_input):
+        entries = corpus.pair_inputs(args.original_input, args.new_input)
+        results = corpus.run(entries, run, make_title_args, args)
+    else:
+        results = run(args)
+    results.update(sysinfo.summarize(host_info))
+    return results